@@ -0,0 +1,4 @@
+"""Benchmarks of dora search on synthetic codebases.
+
+Run `python -m benchmarks --help` from the repository root.
+"""
@@ -0,0 +1,120 @@
+"""Benchmark dora search on synthetic codebases of growing size.
+
+Each measurement runs in a fresh process, so peak RSS and caches of one run don't affect the others.
+A cold run type checks the codebase with an empty mypy cache, a warm one reuses the cache of the cold run.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator
+
+from benchmarks.codebase import CodebaseSpec, generate_codebase
+from benchmarks.measure import measure
+from benchmarks.report import format_run, write_results
+
+# Searched by default: the models and their json() methods.
+DEFAULT_TYPE_EXPRESSIONS = ('bench.*', 'def () -> builtins.str')
+
+
+def make_arg_parser_benchmark() -> argparse.ArgumentParser:
+    """Create arguments parser of the benchmarks.
+
+    Returns:
+        The benchmarks arguments parser.
+    """
+    defaults = CodebaseSpec()
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument(
+        '--modules',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000],
+        help='Sizes of the generated codebases in modules. Default: %(default)s',
+    )
+    parser.add_argument(
+        '-t',
+        '--type-expression',
+        dest='type_expressions',
+        metavar='TYPE_EXPRESSION',
+        action='append',
+        help='The type expression to search for, may be repeated. Default: the models and their json() methods.',
+    )
+    parser.add_argument('--repeat', type=int, default=1, help='Number of cold and warm runs of each size. Default: %(default)s')
+    parser.add_argument('--out', default='benchmark-results.json', help='File to write the results to. Default: %(default)s')
+    parser.add_argument('--work-dir', help='Directory for the generated codebases and mypy caches. Default: a temporary one.')
+    for name, default in defaults.to_dict().items():
+        if name != 'modules':
+            parser.add_argument(
+                '--{name}'.format(name=name.replace('_', '-')),
+                type=int,
+                default=default,
+                help='Codebase parameter, see benchmarks.codebase.CodebaseSpec. Default: %(default)s',
+            )
+
+    return parser
+
+
+def main() -> None:
+    """Generate the codebases, run the benchmarks and write the results."""
+    ns = make_arg_parser_benchmark().parse_args()
+    type_expressions = ns.type_expressions or list(DEFAULT_TYPE_EXPRESSIONS)
+    work_dir = ns.work_dir or tempfile.mkdtemp(prefix='dora-benchmarks-')
+    runs: list[dict[str, Any]] = []
+    for modules in ns.modules:
+        runs.extend(_benchmark_codebase(
+            _codebase_spec(ns, modules),
+            os.path.join(work_dir, 'modules-{modules}'.format(modules=modules)),
+            ns.repeat,
+            type_expressions,
+        ))
+
+    write_results(ns.out, type_expressions, runs)
+    print('Results are written to {path}'.format(path=ns.out))
+    if not ns.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _codebase_spec(ns: argparse.Namespace, modules: int) -> CodebaseSpec:
+    spec_options = {
+        name: getattr(ns, name)
+        for name in CodebaseSpec().to_dict()
+        if name != 'modules'
+    }
+    return CodebaseSpec(modules, **spec_options)
+
+
+def _benchmark_codebase(
+    spec: CodebaseSpec,
+    root: str,
+    repeats: int,
+    type_expressions: list[str],
+) -> Iterator[dict[str, Any]]:
+    codebase_path = generate_codebase(root, spec)
+    cache_dir = os.path.join(root, '.mypy_cache')
+    for repeat in range(repeats):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        for run in ('cold', 'warm'):
+            benchmark_run = _measure(codebase_path, cache_dir, type_expressions)
+            benchmark_run.update({
+                'modules': spec.modules,
+                'run': run,
+                'repeat': repeat,
+                'spec': spec.to_dict(),
+            })
+            print(format_run(benchmark_run))
+            yield benchmark_run
+
+
+def _measure(codebase_path: str, cache_dir: str, type_expressions: list[str]) -> dict[str, Any]:
+    # Measured in a fresh process, so peak RSS and caches of one run don't affect the others.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measure, codebase_path, cache_dir, type_expressions).result()
+
+
+if __name__ == '__main__':
+    main()
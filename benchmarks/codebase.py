@@ -0,0 +1,253 @@
+"""Generator of synthetic codebases with Pydantic-like models."""
+
+import os
+import random
+import shutil
+
+# Base classes of the generated models, mimicking Pydantic and requests APIs with overlapping method names.
+_CORE_MODULE = '''"""Pydantic-like base model."""
+
+from typing import Any
+
+
+class BaseModel:
+    def __init__(self, **data: Any) -> None:
+        for name, value in data.items():
+            setattr(self, name, value)
+
+    def json(self) -> str:
+        return repr(self.__dict__)
+
+    def dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class Response:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def json(self) -> Any:
+        return self.text
+'''
+
+_FIELD_TYPES = ('int', 'str', 'float', 'list[int]', 'dict[str, str]', 'bool | None')
+# Share of the models inherited from the imported models rather than from the base model.
+_INHERITED_SHARE = 0.7
+
+# Generated model: name and inheritance depth from the base model.
+_Model = tuple[str, int]
+
+
+class CodebaseSpec:  # noqa: WPS230
+    """Parameters of a synthetic codebase."""
+
+    def __init__(  # noqa: WPS211
+        self,
+        modules: int = 10,
+        classes_per_module: int = 3,
+        fields_per_class: int = 3,
+        hierarchy_depth: int = 3,
+        functions_per_module: int = 2,
+        calls_per_function: int = 6,
+        imports_per_module: int = 2,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the parameters.
+
+        Args:
+            modules: Number of the generated modules, besides the package and the base models.
+            classes_per_module: Number of the models defined in each module.
+            fields_per_class: Number of the annotated fields of each model.
+            hierarchy_depth: Maximum depth of the models inheritance from the base model.
+            functions_per_module: Number of the functions defined in each module.
+            calls_per_function: Number of statements with calls in each function.
+            imports_per_module: Maximum number of the previous modules imported by each module.
+            seed: Seed of the random choices, the same parameters produce the same codebase.
+        """
+        self.modules = modules
+        self.classes_per_module = classes_per_module
+        self.fields_per_class = fields_per_class
+        self.hierarchy_depth = hierarchy_depth
+        self.functions_per_module = functions_per_module
+        self.calls_per_function = calls_per_function
+        self.imports_per_module = imports_per_module
+        self.seed = seed
+
+    def to_dict(self) -> dict[str, int]:
+        """Get the parameters to store them with the benchmark results.
+
+        Returns:
+            The parameters by their names.
+        """
+        return {
+            'modules': self.modules,
+            'classes_per_module': self.classes_per_module,
+            'fields_per_class': self.fields_per_class,
+            'hierarchy_depth': self.hierarchy_depth,
+            'functions_per_module': self.functions_per_module,
+            'calls_per_function': self.calls_per_function,
+            'imports_per_module': self.imports_per_module,
+            'seed': self.seed,
+        }
+
+
+def generate_codebase(root: str, spec: CodebaseSpec, package: str = 'bench') -> str:
+    """Write a package of synthetic modules, replacing the existing one.
+
+    Each module imports some of the previous ones, defines models inherited from models of the imported
+    modules or from the base model, and functions constructing the models, calling their methods
+    and functions of the imported modules.
+
+    Args:
+        root: Directory to write the package to.
+        spec: Parameters of the codebase.
+        package: Name of the package.
+
+    Returns:
+        Path to the package directory.
+    """
+    package_path = os.path.join(root, package)
+    shutil.rmtree(package_path, ignore_errors=True)
+    os.makedirs(package_path)
+    _write(os.path.join(package_path, '__init__.py'), '')
+    _write(os.path.join(package_path, 'core.py'), _CORE_MODULE)
+
+    generator = _ModuleGenerator(spec, package)
+    for index in range(spec.modules):
+        module_path = os.path.join(package_path, '{module}.py'.format(module=_module_name(index)))
+        _write(module_path, generator.module(index))
+
+    return package_path
+
+
+class _ModuleGenerator:
+    """Generator of the modules in order, each using the models and functions of the previous ones."""
+
+    def __init__(self, spec: CodebaseSpec, package: str) -> None:
+        self._spec = spec
+        self._package = package
+        self._rng = random.Random(spec.seed)
+        # Models of each generated module.
+        self._models: list[list[_Model]] = []
+
+    def module(self, index: int) -> str:
+        imported = sorted(self._rng.sample(
+            range(index),
+            min(index, self._spec.imports_per_module),
+        ))
+        lines = [
+            '"""Synthetic module {index}."""'.format(index=index),
+            '',
+            'from {package} import core'.format(package=self._package),
+        ]
+        lines.extend(
+            'from {package} import {module}'.format(package=self._package, module=_module_name(dep))
+            for dep in imported
+        )
+
+        module_models = _model_names(index, self._spec.classes_per_module)
+        self._models.append([])
+        for name in module_models:
+            lines.extend(self._model(name, imported))
+
+        for function in range(self._spec.functions_per_module):
+            lines.extend(self._function(index, function, module_models, imported))
+
+        return '{text}\n'.format(text='\n'.join(lines))
+
+    def _model(self, name: str, imported: list[int]) -> list[str]:
+        parent, depth = self._parent(imported)
+        self._models[-1].append((name, depth + 1))
+        lines = ['', '', 'class {name}({parent}):'.format(name=name, parent=parent)]
+        lines.extend(self._fields(name, imported))
+        return lines
+
+    def _parent(self, imported: list[int]) -> _Model:
+        parents = [
+            (_qualified_name(dep, model), depth)
+            for dep in imported
+            for model, depth in self._models[dep]
+            if depth < self._spec.hierarchy_depth
+        ]
+        if parents and self._rng.random() < _INHERITED_SHARE:
+            return self._rng.choice(parents)
+
+        return ('core.BaseModel', 0)
+
+    def _fields(self, name: str, imported: list[int]) -> list[str]:
+        field_types = [
+            *_FIELD_TYPES,
+            *(
+                _qualified_name(dep, model)
+                for dep in imported
+                for model, _ in self._models[dep]
+            ),
+        ]
+        return [
+            '    {name}_{field}: {type}'.format(
+                name=name.lower(),
+                field=field,
+                type=self._rng.choice(field_types),
+            )
+            for field in range(self._spec.fields_per_class)
+        ]
+
+    def _function(
+        self,
+        index: int,
+        function: int,
+        module_models: list[str],
+        imported: list[int],
+    ) -> list[str]:
+        lines = [
+            '',
+            '',
+            'def func{index}_{function}(x: int) -> str:'.format(index=index, function=function),
+            '    result = str(x)',
+        ]
+        lines.extend(
+            self._call(call, module_models, imported)
+            for call in range(self._spec.calls_per_function)
+        )
+        lines.append('    return result')
+        return lines
+
+    def _call(self, call: int, module_models: list[str], imported: list[int]) -> str:
+        # Indented statement of the function body.
+        model = self._rng.choice(module_models)
+        kinds = 5 if imported and self._spec.functions_per_module else 4
+        kind = self._rng.randrange(kinds)
+        if kind == 0:
+            return '    model_{call} = {model}(x=x)'.format(call=call, model=model)
+        if kind == 1:
+            return '    result = {model}(x=x).json()'.format(model=model)
+        if kind == 2:
+            return '    data_{call} = {model}(x=x).dict()'.format(call=call, model=model)
+        if kind == 3:
+            return '    response_{call} = core.Response(result).json()'.format(call=call)
+
+        dep = self._rng.choice(imported)
+        function = self._rng.randrange(self._spec.functions_per_module)
+        return '    result = {module}.func{dep}_{function}(x + {call})'.format(
+            module=_module_name(dep),
+            dep=dep,
+            function=function,
+            call=call,
+        )
+
+
+def _model_names(index: int, count: int) -> list[str]:
+    return ['Model{index}_{k}'.format(index=index, k=k) for k in range(count)]
+
+
+def _qualified_name(index: int, model: str) -> str:
+    return '{module}.{model}'.format(module=_module_name(index), model=model)
+
+
+def _module_name(index: int) -> str:
+    return 'm{index:05d}'.format(index=index)
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, 'w') as f:
+        f.write(text)
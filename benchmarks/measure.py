@@ -0,0 +1,76 @@
+"""Measurement of a single search, run in a fresh process."""
+
+import io
+import resource
+import sys
+import time
+from typing import Any
+
+from mypy.options import Options as MypyOptions
+
+from dora.arguments import make_arg_parser
+from dora.matching import TypeCache
+from dora.options import DoraOptions, parse_cli_options
+from dora.profile import Profile
+from dora.render import ResultsWriter
+from dora.search import search
+
+
+def measure(codebase_path: str, cache_dir: str, type_expressions: list[str]) -> dict[str, Any]:
+    """Search in the codebase and measure the phases.
+
+    Args:
+        codebase_path: Path to the codebase.
+        cache_dir: Mypy cache directory.
+        type_expressions: The type expressions to search for.
+
+    Returns:
+        Wall and CPU time of the phases, number of results, mypy errors and peak RSS.
+    """
+    profile = Profile()
+    start = time.perf_counter()
+    with profile.phase('parse options'):
+        options = parse_cli_options(make_arg_parser(), _search_args(codebase_path, cache_dir, type_expressions), profile)
+
+    search_measurements = _measure_search(*options, profile)
+    return {'wall': time.perf_counter() - start, **search_measurements}
+
+
+def _search_args(codebase_path: str, cache_dir: str, type_expressions: list[str]) -> list[str]:
+    args = [codebase_path, '--no-index']
+    for type_expression in type_expressions:
+        args.extend(['-t', type_expression])
+
+    return [*args, '--', '--cache-dir', cache_dir]
+
+
+def _measure_search(dora_options: DoraOptions, mypy_options: MypyOptions, profile: Profile) -> dict[str, Any]:
+    type_cache = TypeCache(dora_options.type_expressions, dora_options.node_kinds)
+    errors, _, search_results = search(dora_options, mypy_options, type_cache, profile=profile)
+    with profile.phase('match'):
+        found = list(search_results)
+
+    with profile.phase('render'):
+        ResultsWriter(io.StringIO()).write_all(found)
+
+    return {
+        'phases': _phase_times(profile),
+        'results': len(found),
+        'mypy_errors': len(errors),
+        'visited_expressions': sum(stats.nodes for stats in profile.modules.values()),
+        'rendered_types': type_cache.render_count,
+        'peak_rss': _peak_rss(),
+    }
+
+
+def _phase_times(profile: Profile) -> dict[str, dict[str, float]]:
+    return {
+        name: {'wall': phase_time.wall, 'cpu': phase_time.cpu}
+        for name, phase_time in profile.phases.items()
+    }
+
+
+def _peak_rss() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere.
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
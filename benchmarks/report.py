@@ -0,0 +1,71 @@
+"""Benchmark results and the environment they are measured in."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any
+
+from mypy.version import __version__ as mypy_version
+
+
+def format_run(benchmark_run: dict[str, Any]) -> str:
+    """Summarize the benchmark run in one line.
+
+    Args:
+        benchmark_run: Measurements of the run with the codebase size and the run kind.
+
+    Returns:
+        Wall time of the run and its main phases, number of results and peak RSS.
+    """
+    phases = benchmark_run['phases']
+    return '{modules:>7} modules {run}: {wall:8.3f}s, type check {check:8.3f}s, render {render:7.3f}s, {results} results, peak RSS {rss:.0f} MiB'.format(
+        modules=benchmark_run['modules'],
+        run=benchmark_run['run'],
+        wall=benchmark_run['wall'],
+        check=phases['type check']['wall'],
+        render=phases['render']['wall'],
+        results=benchmark_run['results'],
+        rss=benchmark_run['peak_rss'] / 1024 ** 2,
+    )
+
+
+def write_results(
+    path: str,
+    type_expressions: list[str],
+    runs: list[dict[str, Any]],
+) -> None:
+    """Write the benchmark runs with the environment metadata as JSON.
+
+    Args:
+        path: File to write the results to.
+        type_expressions: The searched type expressions.
+        runs: Measurements of the runs.
+    """
+    metadata = {
+        'revision': _revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version,
+        'mypy': mypy_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'type_expressions': type_expressions,
+    }
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata, 'runs': runs}, f, indent=2)
+
+
+def _revision() -> str | None:
+    try:
+        git = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return git.stdout.strip()
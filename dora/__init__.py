@@ -12,3 +12,20 @@ Example:
     $ dora 'int' my_module.py
     my_module.py:1:0: def foo() -> int:
 """
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from dora.session import Session
+
+__all__ = ['Session']
+
+
+def __getattr__(name: str) -> Any:
+    # The session imports mypy, which is slow, so it's imported on the first access only.
+    if name == 'Session':
+        from dora.session import Session
+
+        return Session
+
+    raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
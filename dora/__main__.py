@@ -1,75 +1,117 @@
 """Dora CLI."""
 
-import argparse
+import contextlib
 import os
 import sys
 
-from mypy.errors import CompileError
-
+from dora.arguments import (
+    make_arg_parser,
+    make_daemon_arg_parser,
+    make_index_arg_parser,
+)
 from dora.options import parse_cli_options
-from dora.search import search
+from dora.profile import Profile
+
 
+def main() -> None:
+    """CLI entry point."""
+    args = sys.argv[1:]
+    if args[:1] == ['index']:
+        index_main(args[1:])
+    elif args[:1] == ['daemon']:
+        daemon_main(args[1:])
+    else:
+        search_main(args)
 
-def make_arg_parser() -> argparse.ArgumentParser:
-    """Create arguments parser for Dora CLI.
 
-    Usage is patched to add notion of mypy args that cannot be conveniently defined via argparse.
+def search_main(args: list[str]) -> None:
+    """Entry point of `dora` search command.
 
-    Returns:
-        Dora CLI arguments parser.
+    Args:
+        args: The command arguments.
     """
-    parser = argparse.ArgumentParser(
-        description='Search source files by type expressions.',
-        epilog='Arguments after "--" will be passed to mypy. Use `mypy --help` to show available options.',
-    )
-    parser.add_argument(
-        '-t',
-        '--type-expression',
-        help='The type expression to search for. If not provided, all types in the file will be listed.',
-    )
-    parser.add_argument(
-        'paths',
-        nargs='+',
-        help='The source files to search in.',
-    )
-    parser.set_defaults(color=True)
-    parser.add_argument(
-        '--no-color',
-        dest='color',
-        help='Suppress colored output.',
-        action='store_false',
-    )
-    parser.set_defaults(show_mypy_errors=False)
-    parser.add_argument(
-        '--show-mypy-errors',
-        help='Show mypy errors before the search results.',
-        action='store_true',
-    )
-    default_usage = parser.format_usage()[7:-1]
-    parser.usage = '{default_usage} [-- mypy_args]\n'.format(default_usage=default_usage)
-    return parser
+    profile = Profile()
+    with profile.phase('parse options'):
+        dora_options, mypy_options = parse_cli_options(make_arg_parser(), args, profile)
 
+    # Modules importing mypy are imported after the arguments are parsed, so help and usage errors are shown fast.
+    from dora.commands import COMMAND_ERRORS, SearchRun
 
-def main() -> None:
-    """CLI entry point."""
-    parser = make_arg_parser()
-    dora_options, mypy_options = parse_cli_options(parser, sys.argv[1:])
+    search_run = SearchRun(dora_options, mypy_options, profile)
+    try:
+        search_run.run()
+    except COMMAND_ERRORS as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    for report in search_run.reports():
+        print(report, file=sys.stderr)
+
+    if dora_options.trace_out is not None:
+        _save_trace(profile, dora_options.trace_out)
+
+
+def index_main(args: list[str]) -> None:
+    """Entry point of `dora index` command.
+
+    Args:
+        args: The command arguments.
+    """
+    parser = make_index_arg_parser()
+    dora_options, mypy_options = parse_cli_options(parser, args)
+    if mypy_options.cache_dir == os.devnull:
+        parser.error('The index cannot be stored with disabled mypy cache.')
 
-    for source in dora_options.sources:
-        if source.path is None or not os.path.exists(source.path):
-            parser.error('The path "{path}" does not exist.'.format(path=source.path))
+    from dora.commands import COMMAND_ERRORS, build_index
 
     try:
-        build_result, search_results = search(dora_options, mypy_options)
-        for search_result in search_results:
-            print(search_result.to_str(dora_options.color), end='\n\n')
+        index, index_path = build_index(dora_options, mypy_options)
+    except COMMAND_ERRORS as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    print('Indexed {files} files with {occurrences} occurrences of {types} types to {path}'.format(
+        files=len(index.files),
+        occurrences=sum(len(occurrences) for occurrences in index.occurrences),
+        types=len(index.types),
+        path=index_path,
+    ))
+
+
+def daemon_main(args: list[str]) -> None:
+    """Entry point of `dora daemon` command.
+
+    Args:
+        args: The command arguments.
+    """
+    dora_options, mypy_options = parse_cli_options(make_daemon_arg_parser(), args)
+
+    from dora.commands import COMMAND_ERRORS
+    from dora.daemon import Daemon
+    from dora.session import Session
 
-        if dora_options.show_mypy_errors:
-            print(*build_result.errors, sep='\n', file=sys.stderr)
-    except CompileError as e:
+    assert dora_options.daemon_socket is not None
+
+    try:
+        daemon = Daemon(dora_options.daemon_socket, Session(dora_options.paths, mypy_options))
+    except COMMAND_ERRORS as e:
         print(e, file=sys.stderr)
         exit(1)
 
+    sources = len(daemon.session.sources)
+    # Clients connect once the line is printed, so an interruption right after it must still remove the socket.
+    with contextlib.closing(daemon), contextlib.suppress(KeyboardInterrupt):
+        print('Serving {sources} files on {socket}'.format(sources=sources, socket=daemon.socket_path), file=sys.stderr)
+        daemon.serve()
+
+
+def _save_trace(profile: Profile, path: str) -> None:
+    try:
+        profile.trace.save(path)
+    except OSError as e:
+        print('Cannot write the trace to "{path}": {error}'.format(path=path, error=e.strerror), file=sys.stderr)
+        exit(1)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,240 @@
+"""Command line arguments parsers of Dora commands.
+
+Parsers don't import mypy, so help and usage errors are shown fast.
+"""
+
+import argparse
+
+OUTPUT_FORMATS = ('text', 'jsonl', 'binary')
+JOBS_HELP = 'Number of worker processes type checking shards of the files in parallel. Default: %(default)s'
+STORE_TRUE = 'store_true'
+
+
+def make_arg_parser() -> argparse.ArgumentParser:
+    """Create arguments parser for Dora CLI.
+
+    Usage is patched to add notion of mypy args that cannot be conveniently defined via argparse.
+
+    Returns:
+        Dora CLI arguments parser.
+    """
+    parser = argparse.ArgumentParser(
+        description='Search source files by type expressions.',
+        epilog=(
+            'Arguments after "--" will be passed to mypy. Use `mypy --help` to show available options. '
+            + 'Use `dora index` to build an index of the source files types for faster searching '
+            + 'or `dora daemon` to keep them type checked in memory.'
+        ),
+    )
+    parser.add_argument(
+        '-t',
+        '--type-expression',
+        dest='type_expressions',
+        metavar='TYPE_EXPRESSION',
+        action='append',
+        help='The type expression to search for, may be repeated. If not provided, all types in the file will be listed.',
+    )
+    parser.add_argument(
+        '--query-file',
+        metavar='PATH',
+        help='File with type expressions to search for, one per line.',
+    )
+    parser.add_argument(
+        '-k',
+        '--node-kind',
+        dest='node_kinds',
+        metavar='NODE_KINDS',
+        action='append',
+        help='Comma-separated class names of the expressions to search in, e.g. CallExpr,MemberExpr. May be repeated.',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        help='The source files to search in.',
+    )
+    _add_output_args(parser)
+    _add_search_args(parser)
+    _add_report_args(parser)
+    _add_mypy_args_usage(parser)
+    return parser
+
+
+def make_index_arg_parser() -> argparse.ArgumentParser:
+    """Create arguments parser for `dora index` command.
+
+    Returns:
+        Dora index command arguments parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog='dora index',
+        description='Build an index of the source files types. Searches in the indexed files are answered from the index while the files are unchanged.',
+        epilog='Arguments after "--" will be passed to mypy. The index is stored in the mypy cache directory.',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        help='The source files to index.',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help=JOBS_HELP,
+    )
+    parser.add_argument(
+        '--release-types',
+        help='Forget rendered types of each file once it is indexed, so types repeated across files are rendered again.',
+        action=STORE_TRUE,
+    )
+    _add_mypy_args_usage(parser)
+    return parser
+
+
+def make_daemon_arg_parser() -> argparse.ArgumentParser:
+    """Create arguments parser for `dora daemon` command.
+
+    Returns:
+        Dora daemon command arguments parser.
+    """
+    parser = argparse.ArgumentParser(
+        prog='dora daemon',
+        description='Type check the source files and serve searches in them with `dora --daemon SOCKET`. Changed files are rechecked incrementally.',
+        epilog='Arguments after "--" will be passed to mypy.',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='+',
+        help='The source files to serve.',
+    )
+    parser.add_argument(
+        '--socket',
+        dest='daemon_socket',
+        default='.dora.sock',
+        help='The Unix socket to listen on. Default: %(default)s',
+    )
+    _add_mypy_args_usage(parser)
+    return parser
+
+
+def _add_output_args(parser: argparse.ArgumentParser) -> None:
+    """Add arguments defining how the search results are written.
+
+    Args:
+        parser: The Dora CLI arguments parser.
+    """
+    parser.set_defaults(color=True)
+    parser.add_argument(
+        '--no-color',
+        dest='color',
+        help='Suppress colored output.',
+        action='store_false',
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default='text',
+        help='Format of the search results: human readable text, JSON Lines or compact binary records. Default: %(default)s',
+    )
+    parser.add_argument(
+        '--with-source',
+        help='Include lines of the found expressions in jsonl and binary formats.',
+        action=STORE_TRUE,
+    )
+    parser.set_defaults(show_mypy_errors=False)
+    parser.add_argument(
+        '--show-mypy-errors',
+        help='Show mypy errors before the search results.',
+        action=STORE_TRUE,
+    )
+
+
+def _add_search_args(parser: argparse.ArgumentParser) -> None:
+    """Add arguments defining how the source files are searched.
+
+    Args:
+        parser: The Dora CLI arguments parser.
+    """
+    parser.set_defaults(use_index=True)
+    parser.add_argument(
+        '--no-index',
+        dest='use_index',
+        help='Do not use the index built by `dora index`, type check the source files instead.',
+        action='store_false',
+    )
+    parser.add_argument(
+        '--daemon',
+        dest='daemon_socket',
+        metavar='SOCKET',
+        help='Send the search to `dora daemon` listening on the Unix socket.',
+    )
+    parser.add_argument(
+        '--stream',
+        help='Print results of each file as soon as it is type checked, in the type checking order.',
+        action=STORE_TRUE,
+    )
+    parser.add_argument(
+        '--prefilter',
+        help=(
+            'Type check only the files importing modules of the searched types, directly or through other searched files. '
+            + 'Types reaching a file only through third-party modules are missed.'
+        ),
+        action=STORE_TRUE,
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help=JOBS_HELP,
+    )
+    parser.add_argument(
+        '--release-types',
+        help=(
+            'Forget rendered types of each file once it is searched, so types repeated across files are rendered again. '
+            + 'Saves a few percent of peak memory, the rest is held by mypy until the end of the build.'
+        ),
+        action=STORE_TRUE,
+    )
+
+
+def _add_report_args(parser: argparse.ArgumentParser) -> None:
+    """Add arguments of the statistics reported after the search results.
+
+    Args:
+        parser: The Dora CLI arguments parser.
+    """
+    parser.add_argument(
+        '--debug',
+        help='Show cache statistics after the search results.',
+        action=STORE_TRUE,
+    )
+    parser.add_argument(
+        '--profile',
+        help='Show wall and CPU time of the search phases and the slowest modules after the search results.',
+        action=STORE_TRUE,
+    )
+    parser.add_argument(
+        '--trace-out',
+        metavar='PATH',
+        help='Write a trace of the search phases and type checking of each module in Chrome trace event format, e.g. for Perfetto UI.',
+    )
+    parser.add_argument(
+        '--memory-report',
+        help=(
+            'Show peak RSS and memory allocated by the build, the search results and the caches after each phase. '
+            + 'Results are collected before they are written and tracing allocations slows the search down several times.'
+        ),
+        action=STORE_TRUE,
+    )
+
+
+def _add_mypy_args_usage(parser: argparse.ArgumentParser) -> None:
+    """Patch parser usage to add notion of mypy args that cannot be conveniently defined via argparse.
+
+    Args:
+        parser: The parser to patch.
+    """
+    default_usage = parser.format_usage()[7:-1]
+    parser.usage = '{default_usage} [-- mypy_args]\n'.format(default_usage=default_usage)
@@ -0,0 +1,342 @@
+"""Persistent tables of expression types stored next to the mypy cache."""
+
+import contextlib
+import json
+import os
+from typing import Callable
+
+from mypy.build import default_data_dir
+from mypy.modulefinder import compute_search_paths
+from mypy.options import Options as MypyOptions
+from mypy.util import hash_digest
+
+# Location and type of a typed expression: line, column, end line, end column, node kind and type expression.
+TypeRow = tuple[int, int, int, int, str, str]
+# Typed expression with indices of its node kind and type expression in the table.
+EncodedRow = tuple[int, int, int, int, int, int]
+# Indices of the node kinds or type expressions in the table.
+Indices = dict[str, int]
+
+# Mypy options controlling the build rather than types, some of them are changed by Dora itself.
+BUILD_OPTIONS = frozenset((
+    'export_types',
+    'preserve_asts',
+    'verbosity',
+    'incremental',
+    'cache_dir',
+    'sqlite_cache',
+    'skip_cache_mtime_checks',
+    'fine_grained_incremental',
+    'use_fine_grained_cache',
+    'cache_fine_grained',
+    'debug_cache',
+))
+
+
+def cache_directory(options: MypyOptions) -> str:
+    """Get the directory of Dora caches for the given mypy options.
+
+    Args:
+        options: The mypy options defining the cache directory.
+
+    Returns:
+        Path to the directory inside the mypy cache directory.
+    """
+    return os.path.join(
+        options.cache_dir,
+        'dora',
+        '{major}.{minor}'.format(major=options.python_version[0], minor=options.python_version[1]),
+    )
+
+
+def options_hash(options: MypyOptions) -> str:
+    """Hash mypy options and search paths of the build, except the options not affecting types.
+
+    Args:
+        options: The mypy options.
+
+    Returns:
+        Hash of the options.
+    """
+    snapshot = options.snapshot()
+    for name in BUILD_OPTIONS:
+        snapshot.pop(name, None)
+
+    # Paths of the source files are not included, they are hashed by the source files.
+    search_paths = compute_search_paths([], options, default_data_dir())
+    hashed = [snapshot, search_paths.mypy_path, search_paths.package_path, search_paths.typeshed_path]
+    return hash_digest(json.dumps(hashed, sort_keys=True, default=_json_option).encode())
+
+
+def source_hash(path: str) -> str | None:
+    """Hash the source file the same way mypy does.
+
+    Args:
+        path: The source file path.
+
+    Returns:
+        Hash of the file content or None if the file cannot be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return hash_digest(f.read())
+    except OSError:
+        return None
+
+
+class TypeTable:
+    """Types of all expressions of a single module.
+
+    The table is valid as long as mypy source and interface hashes of the module match the stored ones.
+    Node kinds and type expressions are stored once and referenced by the rows, so searches match
+    the distinct types of the table first and decode only the rows of the matching ones.
+    """
+
+    def __init__(
+        self,
+        source_hash: str,
+        interface_hash: str,
+        kinds: list[str],
+        types: list[str],
+        encoded_rows: list[EncodedRow],
+    ) -> None:
+        """Initialize the type table.
+
+        Args:
+            source_hash: Mypy hash of the module source code.
+            interface_hash: Mypy hash of the module public interface.
+            kinds: Distinct node kinds of the expressions.
+            types: Distinct type expressions of the expressions.
+            encoded_rows: Typed expressions of the module referencing their kinds and types by indices.
+        """
+        self.source_hash = source_hash
+        self.interface_hash = interface_hash
+        self.kinds = kinds
+        self.types = types
+        self.encoded_rows = encoded_rows
+        # Hash of the mypy options the module was checked with, see TypeTableStore.
+        self.options_hash = ''
+
+    @classmethod
+    def from_rows(cls, source_hash: str, interface_hash: str, rows: list[TypeRow]) -> 'TypeTable':
+        """Create the table of typed expressions.
+
+        Args:
+            source_hash: Mypy hash of the module source code.
+            interface_hash: Mypy hash of the module public interface.
+            rows: Typed expressions of the module.
+
+        Returns:
+            The table with interned node kinds and types.
+        """
+        kinds: Indices = {}
+        types: Indices = {}
+        encoded_rows = [_encode_row(row, kinds, types) for row in rows]
+        return cls(source_hash, interface_hash, list(kinds), list(types), encoded_rows)
+
+    def matching_rows(self, match_type: Callable[[str], object]) -> list[TypeRow]:
+        """Decode typed expressions of the matching types only.
+
+        Args:
+            match_type: Predicate telling if a type expression matches.
+
+        Returns:
+            The expressions of the matching types, in the order of the module tree.
+        """
+        matching = {index for index, type_expression in enumerate(self.types) if match_type(type_expression)}
+        if not matching:
+            return []
+
+        return [self._decode(row) for row in self.encoded_rows if row[5] in matching]
+
+    def serialize(self) -> str:
+        """Serialize the table to compact JSON.
+
+        Returns:
+            JSON representation of the table.
+        """
+        return json.dumps(
+            {
+                'source_hash': self.source_hash,
+                'interface_hash': self.interface_hash,
+                'options_hash': self.options_hash,
+                'kinds': self.kinds,
+                'types': self.types,
+                'rows': self.encoded_rows,
+            },
+            separators=(',', ':'),
+        )
+
+    @classmethod
+    def deserialize(cls, serialized: str) -> 'TypeTable':
+        """Deserialize the table from JSON produced by TypeTable.serialize.
+
+        Rows are decoded on demand, see TypeTable.matching_rows.
+
+        Args:
+            serialized: JSON representation of the table.
+
+        Returns:
+            Deserialized table.
+
+        Raises:
+            ValueError: If a row references a missing node kind or type.
+        """
+        fields = json.loads(serialized)
+        table = cls(
+            fields['source_hash'],
+            fields['interface_hash'],
+            fields['kinds'],
+            fields['types'],
+            fields['rows'],
+        )
+        table.options_hash = fields['options_hash']
+        if not table._is_valid():
+            raise ValueError('The table rows reference missing node kinds or types.')
+
+        return table
+
+    def _decode(self, row: EncodedRow) -> TypeRow:
+        kind = self.kinds[row[4]]
+        return (*row[:4], kind, self.types[row[5]])
+
+    def _is_valid(self) -> bool:
+        kinds = range(len(self.kinds))
+        types = range(len(self.types))
+        valid_kinds = all(row[4] in kinds for row in self.encoded_rows)
+        return valid_kinds and all(row[5] in types for row in self.encoded_rows)
+
+
+def _encode_row(row: TypeRow, kinds: Indices, types: Indices) -> EncodedRow:
+    """Replace the node kind and type expression of the typed expression with their indices.
+
+    Args:
+        row: The typed expression.
+        kinds: Indices of the node kinds, the new kind is added.
+        types: Indices of the type expressions, the new type expression is added.
+
+    Returns:
+        The encoded typed expression.
+    """
+    kind = kinds.setdefault(row[4], len(kinds))
+    type_expression = types.setdefault(row[5], len(types))
+    return (*row[:4], kind, type_expression)
+
+
+class TypeTableStore:
+    """Storage of module type tables in the mypy cache directory.
+
+    Mypy invalidates its cache on changes of most options affecting types, but not all of them
+    (e.g. incomplete features), so all options are hashed into the tables to not reuse them with different options.
+    Tables of modules rechecked by mypy, e.g. because of changed dependencies, must be saved again or discarded.
+    """
+
+    def __init__(self, options: MypyOptions) -> None:
+        """Initialize the store.
+
+        Args:
+            options: The mypy options defining the cache directory.
+        """
+        self.directory = os.path.join(cache_directory(options), 'types')
+        self.options_hash = options_hash(options)
+        self._tables: dict[str, TypeTable | None] = {}
+
+    @classmethod
+    def enabled(cls, options: MypyOptions) -> bool:
+        """Check if type tables can be stored with the given mypy options.
+
+        Args:
+            options: The mypy options.
+
+        Returns:
+            True if mypy incremental cache is enabled.
+        """
+        return options.incremental and options.cache_dir != os.devnull
+
+    def has_table(self, module: str, path: str) -> bool:
+        """Check if there is a table for the current content of the module.
+
+        Args:
+            module: The module id.
+            path: The module source file path.
+
+        Returns:
+            True if the stored table matches the module source code.
+        """
+        table = self.load(module)
+        if table is None:
+            return False
+
+        return table.source_hash == source_hash(path)
+
+    def load(self, module: str) -> TypeTable | None:
+        """Load the module table.
+
+        Args:
+            module: The module id.
+
+        Returns:
+            The stored table, if any.
+        """
+        if module not in self._tables:
+            try:
+                with open(self._table_path(module), 'r') as f:
+                    table: TypeTable | None = TypeTable.deserialize(f.read())
+            except (OSError, ValueError, LookupError):
+                table = None
+
+            if table is not None and table.options_hash != self.options_hash:
+                table = None
+
+            self._tables[module] = table
+
+        return self._tables[module]
+
+    def save(self, module: str, table: TypeTable) -> None:
+        """Store the module table.
+
+        Args:
+            module: The module id.
+            table: The module table.
+        """
+        table.options_hash = self.options_hash
+        self._tables[module] = table
+        path = self._table_path(module)
+        tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+        # Failing to store the table only means the module will be rechecked next time.
+        with contextlib.suppress(OSError):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                f.write(table.serialize())
+            os.replace(tmp_path, path)
+
+    def discard(self, module: str) -> None:
+        """Remove the module table, e.g. if the module is rechecked but its types are not saved.
+
+        Args:
+            module: The module id.
+        """
+        self._tables[module] = None
+        try:
+            os.remove(self._table_path(module))
+        except OSError:
+            # There is no table.
+            return
+
+    def _table_path(self, module: str) -> str:
+        return os.path.join(self.directory, '{module}.json'.format(module=module))
+
+
+def _json_option(option: object) -> object:
+    """Convert the mypy option to a JSON serializable value.
+
+    Args:
+        option: Value of the option not serializable by default, e.g. a set of error codes.
+
+    Returns:
+        Sorted values of sets, string representation of the rest.
+    """
+    if isinstance(option, (set, frozenset)):
+        return sorted(map(str, option))
+
+    return str(option)
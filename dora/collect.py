@@ -0,0 +1,201 @@
+"""Collection of typed expressions of the type checked modules."""
+
+import time
+from typing import Callable, Iterator, Mapping
+
+from mypy.build import BuildSource
+from mypy.nodes import Expression, MypyFile
+from mypy.server.subexpr import get_subexpressions
+from mypy.types import Type
+
+from dora.cache import TypeRow
+from dora.matching import TypeCache, match_rows
+from dora.profile import ModuleStats, Profile
+from dora.result import SearchResult
+
+
+def type_rows(
+    mypy_file: MypyFile,
+    type_map: Mapping[Expression, Type],
+    type_cache: TypeCache,
+    matching_only: bool = False,
+    stats: ModuleStats | None = None,
+) -> list[TypeRow]:
+    """Collect types of the module expressions.
+
+    Expressions are listed with mypy compiled subexpressions finder in the order of the module tree.
+    Type maps also contain expressions synthesized by mypy during type checking, those are skipped.
+
+    Args:
+        mypy_file: The module tree.
+        type_map: Types of the module expressions.
+        type_cache: Cache of types rendering and matching against the type expressions.
+        matching_only: Collect only expressions of the searched kinds with types matching the type expressions.
+        stats: Statistics of the module to count the visited expressions in.
+
+    Returns:
+        Typed expressions of the module.
+    """
+    subexpressions = get_subexpressions(mypy_file)
+    if stats is not None:
+        stats.nodes += len(subexpressions)
+
+    if matching_only:
+        typed = _matching_expressions(subexpressions, type_map, type_cache)
+    else:
+        typed = _typed_expressions(subexpressions, type_map)
+
+    return [
+        (
+            o.line,
+            o.column,
+            o.end_line or o.line,
+            o.end_column or o.column + 1,
+            o.__class__.__name__,
+            type_cache.render(node_type),
+        )
+        for o, node_type in typed
+    ]
+
+
+class TypeRowsCollector:
+    """Type map hook collecting typed expressions of the source modules."""
+
+    def __init__(  # noqa: WPS211
+        self,
+        sources: list[BuildSource],
+        type_cache: TypeCache,
+        save_tables: bool = False,
+        on_result: Callable[[SearchResult], None] | None = None,
+        release_types: bool = False,
+        profile: Profile | None = None,
+    ) -> None:
+        """Initialize the collector.
+
+        Args:
+            sources: The source files to collect types of.
+            type_cache: Cache of types rendering and matching against the type expressions.
+            save_tables: Collect all types to save them to the type tables store if all types match,
+                otherwise only the matching ones. Types are kept until the end of the build either if they are saved
+                or if they aren't streamed.
+            on_result: Callback receiving search results of each module as soon as it is type checked.
+            release_types: Forget type objects cached while collecting each module, see TypeCache.release_types.
+            profile: Profile to add the collection time and statistics of each module to.
+        """
+        self.type_cache = type_cache
+        # Tables must have all types, otherwise only the matching ones are needed.
+        self.save_tables = save_tables and type_cache.matches_all
+        self.profile = profile
+        self.rows: dict[str, list[TypeRow]] = {}
+        # Modules whose search results were passed to the callback.
+        self.streamed: set[str] = set()
+        self._modules = {source.module for source in sources}
+        self._on_result = on_result
+        self._keep_rows = on_result is None or self.save_tables
+        self._release_types = release_types
+
+    def __call__(self, mypy_file: MypyFile, type_map: dict[Expression, Type]) -> None:
+        """Collect types of the type checked module.
+
+        Args:
+            mypy_file: The module tree.
+            type_map: Types of the module expressions.
+        """
+        if mypy_file.fullname not in self._modules:
+            return
+
+        if self.profile is None:
+            self._collect(mypy_file, type_map)
+            return
+
+        stats = self.profile.module(mypy_file.fullname)
+        rendered = self.type_cache.render_count
+        start = time.perf_counter()
+        with self.profile.phase('collect types', span=''):
+            self._collect(mypy_file, type_map, stats)
+
+        end = time.perf_counter()
+        stats.search_time += end - start
+        stats.rendered += self.type_cache.render_count - rendered
+        if self.profile.tracing:
+            _trace_module(self.profile, stats, start, end)
+
+    def module_results(self, module: str, path: str, rows: list[TypeRow]) -> Iterator[SearchResult]:
+        """Match typed expressions of the module, counting the found occurrences if the search is profiled.
+
+        Args:
+            module: The module id.
+            path: The module source file path.
+            rows: Typed expressions of the module.
+
+        Returns:
+            Found occurrences of the type expressions.
+        """
+        module_results = match_rows(path, rows, self.type_cache)
+        if self.profile is None:
+            return module_results
+
+        return self.profile.module(module).count_hits(module_results)
+
+    def _collect(
+        self,
+        mypy_file: MypyFile,
+        type_map: dict[Expression, Type],
+        stats: ModuleStats | None = None,
+    ) -> None:
+        rows = type_rows(mypy_file, type_map, self.type_cache, not self.save_tables, stats)
+        if self._keep_rows:
+            self.rows[mypy_file.fullname] = rows
+
+        if self._on_result is not None:
+            for search_result in self.module_results(mypy_file.fullname, mypy_file.path, rows):
+                self._on_result(search_result)
+
+            self.streamed.add(mypy_file.fullname)
+
+        if self._release_types:
+            self.type_cache.release_types()
+
+
+def _typed_expressions(
+    subexpressions: list[Expression],
+    type_map: Mapping[Expression, Type],
+) -> Iterator[tuple[Expression, Type]]:
+    for o in subexpressions:
+        node_type = type_map.get(o)
+        if node_type is not None:
+            yield o, node_type
+
+
+def _matching_expressions(
+    subexpressions: list[Expression],
+    type_map: Mapping[Expression, Type],
+    type_cache: TypeCache,
+) -> Iterator[tuple[Expression, Type]]:
+    # Kinds are checked first to not render types of the expressions that aren't searched.
+    node_kinds = type_cache.node_kinds
+    for o in subexpressions:
+        if node_kinds is not None and o.__class__.__name__ not in node_kinds:
+            continue
+
+        node_type = type_map.get(o)
+        if node_type is not None and type_cache.match_type(node_type):
+            yield o, node_type
+
+
+def _trace_module(profile: Profile, stats: ModuleStats, start: float, end: float) -> None:
+    """Trace type checking and search of the module.
+
+    The module is type checked since the previous module or the start of its component.
+
+    Args:
+        profile: The tracing profile.
+        stats: Statistics of the module.
+        start: Start of the module search, time.perf_counter() value.
+        end: End of the module search, time.perf_counter() value.
+    """
+    trace = profile.trace
+    trace.span('type check {module}'.format(module=stats.module), 'module', trace.checkpoint, start)
+    search_stats = {'nodes': stats.nodes, 'rendered': stats.rendered, 'hits': stats.hits}
+    trace.span('search {module}'.format(module=stats.module), 'module', start, end, search_stats)
+    trace.checkpoint = end
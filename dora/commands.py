@@ -0,0 +1,171 @@
+"""Searches and indexing run by Dora commands once their arguments are parsed.
+
+The module imports mypy, so it's imported only after the arguments are parsed and validated.
+"""
+
+from typing import Iterable
+
+from mypy.errors import CompileError
+from mypy.options import Options as MypyOptions
+
+from dora.daemon import DaemonError, search_daemon
+from dora.dependencies import list_dependencies
+from dora.index import TypeIndex, load_index, save_index
+from dora.matching import TypeCache
+from dora.memory import MemoryReport
+from dora.options import DoraOptions
+from dora.parallel import ParallelSearch
+from dora.profile import Profile
+from dora.render import make_writer
+from dora.result import SearchResult
+from dora.search import search
+from dora.source import SourceCache
+
+# Errors stopping the commands, reported without a traceback.
+COMMAND_ERRORS = (CompileError, DaemonError)
+
+# Mypy errors and search results.
+FoundResults = tuple[list[str], Iterable[SearchResult]]
+
+
+class SearchRun:
+    """Search run by `dora` command, from finding the results to reporting the statistics after them."""
+
+    def __init__(self, dora_options: DoraOptions, mypy_options: MypyOptions, profile: Profile) -> None:
+        """Initialize the caches shared by the search phases.
+
+        Args:
+            dora_options: Dora options.
+            mypy_options: Mypy options.
+            profile: Profile of the run, tracing the search phases if a trace is requested.
+        """
+        self.dora_options = dora_options
+        self.mypy_options = mypy_options
+        self.profile = profile
+        self.profile.tracing = dora_options.trace_out is not None
+        self.type_cache = TypeCache(dora_options.type_expressions, dora_options.node_kinds)
+        self.source_cache = SourceCache()
+        # Statistics of the searched modules are collected only if requested.
+        self._modules_profile = profile if dora_options.profile or profile.tracing else None
+        self._writer = make_writer(dora_options, self.source_cache)
+        self._memory_report = MemoryReport() if dora_options.memory_report else None
+        self.errors: list[str] = []
+
+    def run(self) -> None:
+        """Search and write the results to stdout, keeping mypy errors.
+
+        Raises:
+            CompileError: If type checking is blocked by errors.
+            DaemonError: If the daemon is not available or doesn't serve the source files.
+        """
+        errors, search_results = self._find()
+        self.errors = errors
+        if self._memory_report is not None:
+            # Collected to measure memory held by the results.
+            search_results = list(search_results)
+            self._memory_report.checkpoint('search')
+            self._memory_report.count('search results', len(search_results))
+
+        with self.profile.phase('write results'):
+            self._writer.write_all(self._observed(search_results))
+
+        if self._memory_report is not None:
+            self._memory_report.checkpoint('rendering')
+            self._memory_report.count('cached source files', len(self.source_cache))
+            self._memory_report.stop()
+
+    def reports(self) -> list[str]:
+        """Render the requested reports printed after the search results.
+
+        Returns:
+            Mypy errors and the statistics, each report is a string.
+        """
+        reports: list[str] = []
+        if self.dora_options.show_mypy_errors:
+            reports.append('\n'.join(self.errors))
+
+        if self.dora_options.debug:
+            reports.extend((self.type_cache.report(), self.source_cache.report()))
+
+        if self.dora_options.profile:
+            reports.append(self.profile.report())
+
+        if self._memory_report is not None:
+            reports.append(self._memory_report.report())
+
+        return reports
+
+    def _find(self) -> FoundResults:
+        if self.dora_options.daemon_socket is not None:
+            with self.profile.phase('daemon search'):
+                return search_daemon(self.dora_options)
+
+        if self.dora_options.use_index and not self.dora_options.show_mypy_errors:
+            with self.profile.phase('load index'):
+                index = load_index(self.mypy_options)
+
+            sources = self.dora_options.sources
+            if index is not None and index.covers(sources):
+                return [], index.search(sources, self.dora_options.type_expressions, self.dora_options.node_kinds)
+
+        if self.dora_options.jobs > 1:
+            parallel_search = ParallelSearch(self.dora_options, self.mypy_options, self._modules_profile)
+            # The errors are collected while the results are consumed.
+            return parallel_search.errors, parallel_search.search_results()
+
+        return self._search()
+
+    def _search(self) -> FoundResults:
+        on_result = self._writer.write if self.dora_options.stream else None
+        errors, graph, search_results = search(
+            self.dora_options,
+            self.mypy_options,
+            self.type_cache,
+            on_result,
+            self._modules_profile,
+        )
+        if self._memory_report is not None:
+            self._memory_report.checkpoint('build')
+            self._memory_report.count('mypy modules', len(graph))
+
+        return errors, search_results
+
+    def _observed(self, search_results: Iterable[SearchResult]) -> Iterable[SearchResult]:
+        if self.dora_options.profile:
+            search_results = self.profile.timed('match results', search_results)
+
+        if self.profile.tracing:
+            search_results = self.profile.trace.groups('write', search_results, key=_result_path)
+
+        return search_results
+
+
+def build_index(dora_options: DoraOptions, mypy_options: MypyOptions) -> tuple[TypeIndex, str]:
+    """Build the index of all types of the source files and store it in the mypy cache directory.
+
+    Args:
+        dora_options: Dora options with the source files to index.
+        mypy_options: Mypy options.
+
+    Returns:
+        The index and the path to the stored index.
+
+    Raises:
+        CompileError: If type checking is blocked by errors.
+    """
+    search_results: Iterable[SearchResult]
+    if dora_options.jobs > 1:
+        parallel_search = ParallelSearch(dora_options, mypy_options)
+        # Dependencies of the shards are known once all shards are searched.
+        search_results = list(parallel_search.search_results())
+        index_dependencies = list(parallel_search.dependencies.values())
+    else:
+        _, graph, search_results = search(dora_options, mypy_options)
+        index_dependencies = list_dependencies(graph, dora_options.sources)
+
+    index = TypeIndex.build(mypy_options, dora_options.sources, search_results, index_dependencies)
+    return index, save_index(index, mypy_options)
+
+
+def _result_path(search_result: SearchResult) -> str:
+    return search_result.path
@@ -0,0 +1,229 @@
+"""Search daemon serving a search session over a Unix socket."""
+
+import json
+import os
+import socket
+import stat
+from typing import Any, Iterator, TextIO, TypeAlias
+
+from mypy.errors import CompileError
+
+from dora.options import DoraOptions
+from dora.result import SearchResult
+from dora.session import Session
+
+# Fields of a search request, each is a list of strings.
+REQUEST_FIELDS = ('paths', 'type_expressions', 'node_kinds')
+ERROR = 'error'
+# Seconds to wait for a client to send its request or read a response before dropping it,
+# so an idle client doesn't block the clients waiting after it.
+CONNECTION_TIMEOUT = 5
+
+# Mypy errors and search results.
+SearchResponse: TypeAlias = tuple[list[str], list[SearchResult]]
+
+
+class DaemonError(Exception):
+    """Failure to communicate with the daemon."""
+
+
+class Daemon:
+    """Search session served over a Unix socket.
+
+    Each request is a JSON line with absolute paths of the searched source files, the type expressions
+    and the node kinds. The response is a JSON line per search result followed by a line with mypy errors,
+    or a line with an error if the request is invalid.
+    """
+
+    def __init__(self, socket_path: str, session: Session) -> None:
+        """Listen on the Unix socket.
+
+        A socket left by a previous daemon is replaced, any other existing file is left intact.
+
+        Args:
+            socket_path: Path to the Unix socket to listen on.
+            session: The session to search in.
+
+        Raises:
+            DaemonError: If the path exists and is not a socket, or the socket cannot be bound.
+        """
+        if os.path.lexists(socket_path):
+            if not self._is_socket(socket_path):
+                raise DaemonError('The path "{path}" exists and is not a socket.'.format(path=socket_path))
+
+            os.unlink(socket_path)
+
+        self.socket_path = socket_path
+        self.session = session
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._server.bind(socket_path)
+        except OSError as bind_error:
+            self._server.close()
+            raise DaemonError('Cannot listen on "{socket}": {error}'.format(socket=socket_path, error=bind_error))
+
+        self._server.listen()
+
+    def serve(self) -> None:
+        """Serve search requests until interrupted or closed."""
+        while self._server.fileno() != -1:
+            connection, _ = self._server.accept()
+            connection.settimeout(CONNECTION_TIMEOUT)
+            with connection:
+                self._serve_connection(connection)
+
+    def close(self) -> None:
+        """Stop listening and remove the socket."""
+        self._server.close()
+        if self._is_socket(self.socket_path):
+            os.unlink(self.socket_path)
+
+    @classmethod
+    def _is_socket(cls, path: str) -> bool:
+        try:
+            return stat.S_ISSOCK(os.lstat(path).st_mode)
+        except OSError:
+            return False
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        try:
+            with connection.makefile('rw') as stream:
+                self._write_responses(stream)
+        except OSError:
+            # The client has disconnected or timed out, the other clients are still served.
+            return
+
+    def _write_responses(self, stream: TextIO) -> None:
+        try:
+            for response in self._search(_parse_request(stream.readline())):
+                stream.write(json.dumps(response))
+                stream.write('\n')
+        except (CompileError, ValueError) as search_error:
+            stream.write(json.dumps({ERROR: str(search_error)}))
+            stream.write('\n')
+
+    def _search(self, request: dict[str, list[str]]) -> Iterator[Any]:
+        self.session.refresh()
+
+        # Paths not among the session source files are rejected with ValueError.
+        for search_result in self.session.query(**request):
+            yield [
+                os.path.abspath(search_result.path),
+                search_result.line,
+                search_result.column,
+                search_result.end_line,
+                search_result.end_column,
+                search_result.node_kind,
+                search_result.type_expression,
+                search_result.queries,
+            ]
+
+        yield {'errors': self.session.errors}
+
+
+def search_daemon(dora_options: DoraOptions) -> SearchResponse:
+    """Search for a type expression with the daemon.
+
+    Args:
+        dora_options: Dora options with the daemon socket.
+
+    Returns:
+        Mypy errors and search results.
+
+    Raises:
+        DaemonError: If the daemon is not available or doesn't serve the source files.
+    """
+    assert dora_options.daemon_socket is not None
+    source_paths = [source.path for source in dora_options.sources if source.path]
+    paths = {os.path.abspath(path): path for path in source_paths}
+    request = {'paths': list(paths), 'type_expressions': dora_options.type_expressions, 'node_kinds': dora_options.node_kinds}
+
+    client = _connect(dora_options.daemon_socket)
+    with client, client.makefile('rw') as stream:
+        stream.write(json.dumps(request))
+        stream.write('\n')
+        stream.flush()
+        return _read_responses(stream, paths)
+
+
+def _read_responses(stream: TextIO, paths: dict[str, str]) -> SearchResponse:
+    """Read the daemon responses to a search request.
+
+    Args:
+        stream: The connection stream.
+        paths: The searched paths as given to dora by the absolute paths sent to the daemon.
+
+    Returns:
+        Mypy errors and search results.
+
+    Raises:
+        DaemonError: If the daemon responded with an error or closed the connection before the end of the response.
+    """
+    search_results: list[SearchResult] = []
+    # Matched type expressions shared between the results.
+    tags: dict[tuple[str, ...], tuple[str, ...]] = {}
+    for response in map(json.loads, stream):
+        if isinstance(response, dict):
+            if 'errors' not in response:
+                raise DaemonError(response[ERROR])
+
+            return response['errors'], search_results
+
+        query_tags = tuple(response.pop())
+        query_tags = tags.setdefault(query_tags, query_tags)
+        path = paths[response.pop(0)]
+        search_results.append(SearchResult(path, tuple(response), query_tags))
+
+    raise DaemonError('The daemon closed the connection unexpectedly.')
+
+
+def _connect(socket_path: str) -> socket.socket:
+    """Connect to the daemon.
+
+    Args:
+        socket_path: Path to the Unix socket the daemon listens on.
+
+    Returns:
+        The connected client socket.
+
+    Raises:
+        DaemonError: If the daemon is not available.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError as connect_error:
+        client.close()
+        raise DaemonError('Cannot connect to the daemon on "{socket}": {error}'.format(socket=socket_path, error=connect_error))
+
+    return client
+
+
+def _parse_request(line: str) -> dict[str, list[str]]:
+    """Parse and validate the search request.
+
+    Args:
+        line: The request JSON line.
+
+    Returns:
+        The request fields.
+
+    Raises:
+        ValueError: If the request is not valid JSON or a field is not a list of strings.
+    """
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError('Invalid request: expected a JSON object.')
+
+    for field in REQUEST_FIELDS:
+        if not _is_strings_list(request.get(field)):
+            raise ValueError('Invalid request: "{field}" must be a list of strings.'.format(field=field))
+
+    return {name: request[name] for name in REQUEST_FIELDS}
+
+
+def _is_strings_list(field_value: object) -> bool:
+    if not isinstance(field_value, list):
+        return False
+
+    return all(isinstance(string, str) for string in field_value)
@@ -0,0 +1,68 @@
+"""Source files the indexed files depend on, e.g. of third-party packages and typeshed."""
+
+import os
+
+from mypy.build import BuildSource, Graph, State
+
+from dora.cache import source_hash
+
+# Source file of a module the indexed files depend on: path, size, modification time in nanoseconds and mypy hash.
+Dependency = tuple[str, int, int, str]
+
+
+def list_dependencies(graph: Graph, sources: list[BuildSource]) -> list[Dependency]:
+    """List source files of the modules the built source files depend on.
+
+    Args:
+        graph: The build graph.
+        sources: The built source files, not included.
+
+    Returns:
+        The dependencies with their sizes, modification times and hashes at the time of the build.
+    """
+    modules = {source.module for source in sources}
+    found: list[Dependency] = []
+    for state in graph.values():
+        if state.id not in modules:
+            dependency = _dependency(state)
+            if dependency is not None:
+                found.append(dependency)
+
+    return found
+
+
+def is_unchanged(dependency: Dependency) -> bool:
+    """Check if the dependency source file is the same as at the time of the build.
+
+    Files are hashed only if their sizes or modification times differ, the same way mypy validates its cache.
+
+    Args:
+        dependency: The dependency.
+
+    Returns:
+        True if the file has the same content.
+    """
+    path, size, mtime, file_hash = dependency
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return False
+
+    if (path_stat.st_size, path_stat.st_mtime_ns) == (size, mtime):
+        return True
+
+    return source_hash(path) == file_hash
+
+
+def _dependency(state: State) -> Dependency | None:
+    # Modules fresh in the mypy cache are not parsed and have only the hash from the cache.
+    file_hash = state.meta.hash if state.meta else state.source_hash
+    if not state.path or not file_hash:
+        return None
+
+    try:
+        path_stat = os.stat(state.path)
+    except OSError:
+        return None
+
+    return (state.path, path_stat.st_size, path_stat.st_mtime_ns, file_hash)
@@ -0,0 +1,330 @@
+"""Persistent inverted index from types to their occurrences in the source files."""
+
+import json
+import os
+from typing import Generator, Iterable
+
+from mypy.build import BuildSource
+from mypy.options import Options as MypyOptions
+
+from dora.cache import cache_directory, options_hash, source_hash
+from dora.dependencies import Dependency, is_unchanged
+from dora.query import TypeQuery, type_names
+from dora.result import SearchResult
+
+# Occurrence of a type: file id, line, column, end line, end column, node kind id and sequence number.
+# Sequence numbers preserve the order of occurrences in the files across all types.
+Occurrence = tuple[int, int, int, int, int, int, int]
+# Ids of the matching types to the type expressions they match if several are searched.
+TypeTags = dict[int, tuple[str, ...]]
+INDEX_FILE = 'index.json'
+
+
+def load_index(mypy_options: MypyOptions) -> 'TypeIndex | None':
+    """Load the index stored in the mypy cache directory.
+
+    Args:
+        mypy_options: Mypy options.
+
+    Returns:
+        The stored index if any and if it was built with the same options.
+    """
+    try:
+        with open(os.path.join(cache_directory(mypy_options), INDEX_FILE), 'r') as f:
+            serialized = f.read()
+    except OSError:
+        return None
+
+    try:
+        index = TypeIndex.deserialize(serialized)
+    except (ValueError, LookupError, TypeError):
+        return None
+
+    if index.options_hash != options_hash(mypy_options):
+        return None
+
+    return index
+
+
+def save_index(index: 'TypeIndex', mypy_options: MypyOptions) -> str:
+    """Store the index in the mypy cache directory.
+
+    Args:
+        index: The index to store.
+        mypy_options: Mypy options.
+
+    Returns:
+        Path to the stored index.
+    """
+    path = os.path.join(cache_directory(mypy_options), INDEX_FILE)
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        f.write(index.serialize())
+    os.replace(tmp_path, path)
+    return path
+
+
+class TypeIndex:  # noqa: WPS230
+    """Inverted index from types to their occurrences.
+
+    Each type is indexed by its full rendered form and by all fully-qualified names it contains.
+    The index is valid as long as the indexed files and the files they depend on are not changed.
+    """
+
+    def __init__(self, options_hash: str) -> None:
+        """Initialize an empty index.
+
+        Args:
+            options_hash: Hash of the mypy options the files were checked with.
+        """
+        self.options_hash = options_hash
+        # Indexed files as (path, module, source hash).
+        self.files: list[tuple[str, str, str]] = []
+        # Source files of the modules the indexed files depend on, e.g. of third-party packages and typeshed.
+        self.dependencies: list[Dependency] = []
+        self.kinds: list[str] = []
+        self.types: list[str] = []
+        # Occurrences of each type, ordered by file and by position in the file.
+        self.occurrences: list[list[Occurrence]] = []
+        # Fully-qualified name to ids of types containing it.
+        self.names: dict[str, list[int]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        mypy_options: MypyOptions,
+        sources: list[BuildSource],
+        search_results: Iterable[SearchResult],
+        dependencies: list[Dependency],
+    ) -> 'TypeIndex':
+        """Build the index from the search results of all types.
+
+        Args:
+            mypy_options: Mypy options.
+            sources: The indexed source files.
+            search_results: Occurrences of all types in the source files.
+            dependencies: Source files of the modules the indexed files depend on.
+
+        Returns:
+            The index.
+        """
+        index = cls(options_hash(mypy_options))
+        index.dependencies = dependencies
+        index.files = [
+            (source.path, source.module, source_hash(source.path) or '')
+            for source in sources
+            if source.path is not None and source.module is not None
+        ]
+        builder = _IndexBuilder(index)
+        for search_result in search_results:
+            builder.add(search_result)
+
+        return index
+
+    def serialize(self) -> str:
+        """Serialize the index to JSON.
+
+        Returns:
+            JSON representation of the index.
+        """
+        return json.dumps(
+            {
+                'options_hash': self.options_hash,
+                'files': self.files,
+                'dependencies': self.dependencies,
+                'kinds': self.kinds,
+                'types': self.types,
+                'occurrences': self.occurrences,
+                'names': self.names,
+            },
+            separators=(',', ':'),
+        )
+
+    @classmethod
+    def deserialize(cls, serialized: str) -> 'TypeIndex':
+        """Deserialize the index from JSON produced by TypeIndex.serialize.
+
+        Args:
+            serialized: JSON representation of the index.
+
+        Returns:
+            Deserialized index.
+        """
+        fields = json.loads(serialized)
+        index = cls(fields['options_hash'])
+        index.files = list(map(tuple, fields['files']))
+        index.dependencies = list(map(tuple, fields['dependencies']))
+        index.kinds = fields['kinds']
+        index.types = fields['types']
+        index.occurrences = [list(map(tuple, occurrences)) for occurrences in fields['occurrences']]
+        index.names = fields['names']
+        return index
+
+    def covers(self, sources: list[BuildSource]) -> bool:
+        """Check if the index is up to date and contains all the sources.
+
+        Types of a file depend on other files, so all indexed files and their dependencies must be unchanged,
+        not only the searched ones.
+
+        Args:
+            sources: The source files to search in.
+
+        Returns:
+            True if the sources can be searched with the index.
+        """
+        modules = [source.module for source in sources]
+        if len(set(modules)) != len(modules):
+            # Let mypy report duplicated modules.
+            return False
+
+        indexed = {indexed_file[:2] for indexed_file in self.files}
+        if not all((source.path, source.module) in indexed for source in sources):
+            return False
+
+        files_unchanged = all(
+            source_hash(path) == file_hash
+            for path, _, file_hash in self.files
+        )
+        return files_unchanged and all(map(is_unchanged, self.dependencies))
+
+    def search(
+        self,
+        sources: list[BuildSource],
+        type_expressions: list[str],
+        node_kinds: list[str] | None = None,
+    ) -> Generator[SearchResult, None, None]:
+        """Search for type expressions with the index.
+
+        Args:
+            sources: The source files to search in, the index must cover them.
+            type_expressions: The type expressions to search for. If empty, all types are listed.
+            node_kinds: Class names of the expressions to search in. If empty, all expressions are searched.
+
+        Yields:
+            Found occurrences of the type expressions ordered as the sources.
+        """
+        type_tags = _type_tags(self, type_expressions)
+        for occurrence, type_id in self._found(sources, type_tags, node_kinds):
+            location = occurrence[1:5]
+            yield SearchResult(
+                self.files[occurrence[0]][0],
+                (*location, self.kinds[occurrence[5]], self.types[type_id]),
+                type_tags[type_id],
+            )
+
+    def _found(
+        self,
+        sources: list[BuildSource],
+        type_ids: Iterable[int],
+        node_kinds: list[str] | None,
+    ) -> list[tuple[Occurrence, int]]:
+        file_order, searched_kinds = _search_filters(self, sources, node_kinds)
+        found = [
+            (occurrence, type_id)
+            for type_id in type_ids
+            for occurrence in self.occurrences[type_id]
+            if file_order[occurrence[0]] is not None and searched_kinds[occurrence[5]]
+        ]
+        # Sources are searched in their order, occurrences of each file in their sequence order.
+        return sorted(found, key=lambda found_type: (
+            file_order[found_type[0][0]],
+            found_type[0][6],
+        ))
+
+
+class _IndexBuilder:
+    """Builder adding occurrences of the search results to the index with the indexed files."""
+
+    def __init__(self, index: TypeIndex) -> None:
+        self.index = index
+        self._file_ids = {
+            path: file_id
+            for file_id, (path, _, _) in enumerate(index.files)
+        }
+        self._kind_ids: dict[str, int] = {}
+        self._type_ids: dict[str, int] = {}
+        self._size = 0
+
+    def add(self, search_result: SearchResult) -> None:
+        kind_id = self._kind_ids.setdefault(search_result.node_kind, len(self._kind_ids))
+        if kind_id == len(self.index.kinds):
+            self.index.kinds.append(search_result.node_kind)
+
+        self.index.occurrences[self._type_id(search_result.type_expression)].append((
+            self._file_ids[search_result.path],
+            search_result.line,
+            search_result.column,
+            search_result.end_line,
+            search_result.end_column,
+            kind_id,
+            self._size,
+        ))
+        self._size += 1
+
+    def _type_id(self, type_expression: str) -> int:
+        type_id = self._type_ids.get(type_expression)
+        if type_id is not None:
+            return type_id
+
+        type_id = len(self.index.types)
+        self._type_ids[type_expression] = type_id
+        self.index.types.append(type_expression)
+        self.index.occurrences.append([])
+        for name in type_names(type_expression):
+            self.index.names.setdefault(name, []).append(type_id)
+
+        return type_id
+
+
+def _type_tags(index: TypeIndex, type_expressions: list[str]) -> TypeTags:
+    """Find the types matching the type expressions.
+
+    Args:
+        index: The index.
+        type_expressions: The type expressions to search for. If empty, all types match.
+
+    Returns:
+        Ids of the matching types to the type expressions they match if several are searched, otherwise to nothing.
+    """
+    queries = list(map(TypeQuery, type_expressions)) or [TypeQuery(None)]
+    type_tags: TypeTags = {}
+    for query in queries:
+        tag = (query.type_expression or '',) if len(queries) > 1 else ()
+        for type_id in _match_types(index, query):
+            type_tags[type_id] = type_tags.get(type_id, ()) + tag
+
+    return type_tags
+
+
+def _match_types(index: TypeIndex, query: TypeQuery) -> Iterable[int]:
+    if query.type_expression is None:
+        return range(len(index.types))
+
+    # Matching types contain all fully-qualified names of the query.
+    candidates: Iterable[int] = range(len(index.types))
+    if query.names:
+        type_ids = (set(index.names.get(name, ())) for name in query.names)
+        candidates = sorted(set.intersection(*type_ids))
+
+    return [type_id for type_id in candidates if query.match_text(index.types[type_id])]
+
+
+def _search_filters(
+    index: TypeIndex,
+    sources: list[BuildSource],
+    node_kinds: list[str] | None,
+) -> tuple[list[int | None], list[bool]]:
+    """Select the indexed files and node kinds to search in.
+
+    Args:
+        index: The index.
+        sources: The source files to search in.
+        node_kinds: Class names of the expressions to search in. If empty, all expressions are searched.
+
+    Returns:
+        Search order of each indexed file, None if it is not searched, and whether each node kind is searched.
+    """
+    source_order = {source.path: order for order, source in enumerate(sources)}
+    file_order = [source_order.get(indexed_file[0]) for indexed_file in index.files]
+    return file_order, [not node_kinds or kind in node_kinds for kind in index.kinds]
@@ -0,0 +1,178 @@
+"""Matching of types against the searched type expressions."""
+
+import sys
+from typing import Generator, Iterable
+
+from mypy.types import Type
+
+from dora.cache import TypeRow
+from dora.query import TypeQuery
+from dora.result import SearchResult
+
+
+class TypeCache:
+    """Renderings of types and decisions which type expressions they match.
+
+    The same type objects are shared by many expressions, and even more expressions have equal types,
+    so each distinct type object is rendered only once and each distinct rendering is matched against
+    all type expressions only once.
+    """
+
+    def __init__(self, type_expressions: list[str], node_kinds: list[str] | None = None) -> None:
+        """Initialize empty cache.
+
+        Args:
+            type_expressions: The type expressions to search for. If empty, all types match.
+            node_kinds: Class names of the expressions to search in. If empty, all expressions are searched.
+        """
+        self._queries = [TypeQuery(type_expression) for type_expression in type_expressions] or [TypeQuery(None)]
+        # Searched node kinds, None if all expressions are searched.
+        self.node_kinds = frozenset(node_kinds) if node_kinds else None
+        # Neither type expressions nor node kinds are searched, so all types of all expressions match.
+        self.matches_all = not type_expressions and self.node_kinds is None
+        # Matched type expressions are reported only if there is a choice.
+        self._tagged = len(type_expressions) > 1
+        # Rendered types and rejected types by their ids. Types are referenced to not reuse ids of collected types.
+        self._rendered: dict[int, tuple[Type, str]] = {}
+        self._rejected: dict[int, Type] = {}
+        self._matched: dict[str, tuple[int, ...]] = {}
+        self._tags: dict[tuple[int, ...], tuple[str, ...]] = {}
+        self.render_lookups = 0
+        self.render_count = 0
+        self.match_lookups = 0
+        self.reject_count = 0
+
+    def render(self, node_type: Type) -> str:
+        """Render the type to string.
+
+        Args:
+            node_type: The type to render.
+
+        Returns:
+            The type rendered by mypy.
+        """
+        self.render_lookups += 1
+        rendered = self._rendered.get(id(node_type))
+        if rendered is None:
+            self.render_count += 1
+            rendered = (node_type, sys.intern(str(node_type)))
+            self._rendered[id(node_type)] = rendered
+
+        return rendered[1]
+
+    def match_type(self, node_type: Type) -> tuple[int, ...]:
+        """Match the type against the type expressions, rendering it only if necessary.
+
+        Args:
+            node_type: The type to match.
+
+        Returns:
+            Indices of the matching type expressions, empty if none matches.
+        """
+        type_id = id(node_type)
+        if type_id in self._rejected:
+            self.match_lookups += 1
+            return ()
+
+        if type_id in self._rendered:
+            return self.match(self.render(node_type))
+
+        if all(query.rejects(node_type) for query in self._queries):
+            self.match_lookups += 1
+            self.reject_count += 1
+            self._rejected[type_id] = node_type
+            return ()
+
+        return self.match(self.render(node_type))
+
+    def release_types(self) -> None:
+        """Forget the rendered and rejected type objects to let mypy free them.
+
+        Renderings are interned and matching decisions are kept by the rendered types,
+        so only the types seen again are rendered again.
+        """
+        self._rendered.clear()
+        self._rejected.clear()
+
+    def match(self, rendered: str) -> tuple[int, ...]:
+        """Match the rendered type against the type expressions.
+
+        Args:
+            rendered: The rendered type.
+
+        Returns:
+            Indices of the matching type expressions, empty if none matches.
+        """
+        self.match_lookups += 1
+        matched = self._matched.get(rendered)
+        if matched is None:
+            matched = tuple(
+                index
+                for index, query in enumerate(self._queries)
+                if query.match_text(rendered)
+            )
+            self._matched[rendered] = matched
+
+        return matched
+
+    def tags(self, matched: tuple[int, ...]) -> tuple[str, ...]:
+        """Get the matched type expressions to tag the search result with.
+
+        Args:
+            matched: Indices of the matching type expressions.
+
+        Returns:
+            The type expressions if several were searched, otherwise nothing.
+        """
+        if not self._tagged:
+            return ()
+
+        tags = self._tags.get(matched)
+        if tags is None:
+            tags = tuple(self._queries[index].type_expression or '' for index in matched)
+            self._tags[matched] = tags
+
+        return tags
+
+    def report(self) -> str:
+        """Report cache lookups and hit rates.
+
+        Returns:
+            Human readable statistics.
+        """
+        lines = [
+            _hit_rate_line('Rendered types', self.render_lookups, self.render_count),
+            _hit_rate_line('Matched types', self.match_lookups, len(self._matched) + self.reject_count),
+            'Rejected types without rendering: {rejected}'.format(rejected=self.reject_count),
+        ]
+        return '\n'.join(lines)
+
+
+def match_rows(path: str, rows: Iterable[TypeRow], type_cache: TypeCache) -> Generator[SearchResult, None, None]:
+    """Match typed expressions of the source file against the type expressions.
+
+    Args:
+        path: The source file path.
+        rows: Typed expressions of the source file.
+        type_cache: Cache of types matching against the searched type expressions.
+
+    Yields:
+        Found occurrences of the type expressions.
+    """
+    node_kinds = type_cache.node_kinds
+    for row in rows:
+        if node_kinds is not None and row[4] not in node_kinds:
+            continue
+
+        matched = type_cache.match(row[5])
+        if matched:
+            yield SearchResult(path, row, type_cache.tags(matched))
+
+
+def _hit_rate_line(name: str, lookups: int, distinct: int) -> str:
+    return '{name}: {lookups} lookups, {distinct} distinct, {hit_rate:.1%} hit rate'.format(
+        name=name,
+        lookups=lookups,
+        distinct=distinct,
+        hit_rate=(lookups - distinct) / lookups if lookups else 0,
+    )
@@ -0,0 +1,199 @@
+"""Memory usage of the search phases attributed to the data structures holding it."""
+
+import inspect
+import os
+import resource
+import sys
+import tracemalloc
+import types
+from collections import Counter
+
+import mypy
+
+from dora import cache, collect, daemon, index, matching, render, result, source
+from dora.mypy_legacy import build
+
+# Source file with the first and the last lines of allocating code.
+CodeRange = tuple[str, int, int]
+# Category of allocations with the ranges of its allocating code.
+CategoryRanges = tuple[str, list[CodeRange]]
+
+# Allocating code of each category: whole modules, classes or functions, the first matching category is taken.
+CATEGORIES = (
+    ('search results', (result.SearchResult.__init__, matching.match_rows, index.TypeIndex.search, daemon.search_daemon)),
+    ('type index', (index,)),
+    ('type rows', (collect, cache)),
+    ('rendered types', (matching.TypeCache,)),
+    ('source cache', (source,)),
+    ('rendering buffers', (render, result.SearchResult.render)),
+    ('mypy build', (build, mypy)),
+)
+OTHER_CATEGORY = 'other'
+
+MIB = 1024 ** 2
+NAME_COLUMN = '{name:<24}'
+SIZE_COLUMN = ' {size:>12.1f}'
+
+
+class MemoryCheckpoint:
+    """Memory usage at the end of a phase."""
+
+    def __init__(
+        self,
+        name: str,
+        peak_rss: int,
+        traced: int,
+        traced_peak: int,
+        categories: dict[str, int],
+    ) -> None:
+        """Initialize the checkpoint.
+
+        Args:
+            name: The phase name.
+            peak_rss: Peak resident set size of the process since its start, in bytes.
+            traced: Memory allocated by Python and still alive, in bytes.
+            traced_peak: Peak of the allocated memory during the phase, in bytes.
+            categories: Alive memory by the allocating code category, in bytes.
+        """
+        self.name = name
+        self.peak_rss = peak_rss
+        self.traced = traced
+        self.traced_peak = traced_peak
+        self.categories = categories
+
+
+class MemoryReport:
+    """Peak RSS and alive allocations after each phase, traced with tracemalloc.
+
+    Allocations are attributed to the data structures by the code allocating them. Mypy is compiled,
+    so its allocations are attributed to the interpreted code calling it, i.e. the mypy build.
+    Tracing slows the search down several times and adds its own memory overhead.
+    """
+
+    def __init__(self) -> None:
+        """Start tracing the allocations."""
+        self.checkpoints: list[MemoryCheckpoint] = []
+        self.counts: list[tuple[str, int]] = []
+        self._ranges = _category_ranges()
+        self._category_names = [category for category, _ in self._ranges]
+        self._category_names.append(OTHER_CATEGORY)
+        tracemalloc.start()
+
+    def checkpoint(self, name: str) -> None:
+        """Record memory usage at the end of the phase.
+
+        Args:
+            name: The phase name.
+        """
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        categories = self._categories(tracemalloc.take_snapshot())
+        self.checkpoints.append(MemoryCheckpoint(name, _peak_rss(), traced, traced_peak, categories))
+        tracemalloc.reset_peak()
+
+    def count(self, name: str, count: int) -> None:
+        """Record number of objects of a kind.
+
+        Args:
+            name: The kind of objects, e.g. `search results`.
+            count: Number of the objects.
+        """
+        self.counts.append((name, count))
+
+    def stop(self) -> None:
+        """Stop tracing the allocations."""
+        tracemalloc.stop()
+
+    def report(self) -> str:
+        """Report memory usage after each phase.
+
+        Returns:
+            Human readable statistics, sizes are in MiB.
+        """
+        names = ''.join(
+            ' {name:>12}'.format(name=checkpoint.name)
+            for checkpoint in self.checkpoints
+        )
+        lines = [
+            NAME_COLUMN.format(name='Memory after, MiB') + names,
+            _sizes_line('peak RSS', [checkpoint.peak_rss for checkpoint in self.checkpoints]),
+            _sizes_line('traced', [checkpoint.traced for checkpoint in self.checkpoints]),
+            _sizes_line('traced peak', [checkpoint.traced_peak for checkpoint in self.checkpoints]),
+        ]
+        for category in self._category_names:
+            lines.append(_sizes_line(
+                '  {category}'.format(category=category),
+                [checkpoint.categories.get(category, 0) for checkpoint in self.checkpoints],
+            ))
+
+        lines.extend(
+            '{name}: {count}'.format(name=name, count=count)
+            for name, count in self.counts
+        )
+        return '\n'.join(lines)
+
+    def _categories(self, snapshot: tracemalloc.Snapshot) -> dict[str, int]:
+        categories: Counter[str] = Counter()
+        for stat in snapshot.statistics('lineno'):
+            categories[self._category(stat.traceback[0])] += stat.size
+
+        return categories
+
+    def _category(self, frame: tracemalloc.Frame) -> str:
+        for category, ranges in self._ranges:
+            for path, first, last in ranges:
+                if frame.filename.startswith(path) and first <= frame.lineno <= last:
+                    return category
+
+        return OTHER_CATEGORY
+
+
+def _category_ranges() -> list[CategoryRanges]:
+    """Find source lines of the allocating code of each category.
+
+    Returns:
+        Categories with files and line ranges of their code. Paths are matched as prefixes, so paths of packages
+        are their directories ending with a separator.
+    """
+    return [
+        (category, [code_range for allocator in allocators for code_range in _code_ranges(allocator)])
+        for category, allocators in CATEGORIES
+    ]
+
+
+def _code_ranges(allocator: object) -> list[CodeRange]:
+    if isinstance(allocator, types.ModuleType):
+        path = allocator.__file__ or ''
+        if os.path.basename(path) == '__init__.py':
+            path = os.path.dirname(path) + os.sep
+
+        return [(path, 0, sys.maxsize)]
+
+    if isinstance(allocator, types.FunctionType):
+        return [_function_range(allocator)]
+
+    return [_function_range(function) for _, function in inspect.getmembers(allocator, inspect.isfunction)]
+
+
+def _function_range(function: types.FunctionType) -> CodeRange:
+    code = function.__code__
+    lines = [
+        line
+        for _, _, line in code.co_lines()
+        if line is not None
+    ]
+    last = max(lines, default=code.co_firstlineno)
+    return (code.co_filename, code.co_firstlineno, last)
+
+
+def _sizes_line(name: str, sizes: list[int]) -> str:
+    columns = ''.join(
+        SIZE_COLUMN.format(size=size / MIB)
+        for size in sizes
+    )
+    return NAME_COLUMN.format(name=name) + columns
+
+
+def _peak_rss() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
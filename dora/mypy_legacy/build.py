@@ -0,0 +1,237 @@
+# This work is substantially derived from mypy (https://mypy-lang.org/), and
+# is licensed under the same terms
+# (https://github.com/python/mypy/blob/master/LICENSE) with all credits to the
+# original author(s) and contributor(s), reproduced below.
+#
+# = = = = =
+#
+# The MIT License
+#
+# Copyright (c) 2012-2023 Jukka Lehtosalo and contributors
+# Copyright (c) 2015-2023 Dropbox, Inc.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# = = = = =
+
+"""Mypy build passing expression types of each checked module to a hook.
+
+Mypy collects types of all modules into a single BuildManager.all_types mapping, which loses the module
+each expression belongs to. This module repeats mypy.build.build() but replaces the mapping with one
+forwarding the type map of each module to the hook right after the module is type checked.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import platform
+import sys
+import time
+from typing import Callable, Sequence, TextIO
+
+from mypy.build import (
+    BuildManager,
+    BuildResult,
+    add_catch_all_gitignore,
+    default_data_dir,
+    dispatch,
+    dump_line_checking_stats,
+    dump_timing_stats,
+    exclude_from_backups,
+    load_plugins,
+    record_missing_stub_packages,
+)
+from mypy.error_formatter import OUTPUT_CHOICES
+from mypy.errors import CompileError, Errors
+from mypy.fscache import FileSystemCache
+from mypy.modulefinder import BuildSource, BuildSourceSet, compute_search_paths
+from mypy.nodes import Expression, MypyFile
+from mypy.options import Options
+from mypy.plugin import Plugin
+from mypy.types import Type
+from mypy.typestate import reset_global_state, type_state
+from mypy.util import read_py_file
+from mypy.version import __version__
+
+# Receives the tree of the type checked module and types of its expressions.
+# The type map is cleared and the tree may be freed once the hook returns, so they must be consumed or copied.
+TypeMapHook = Callable[[MypyFile, dict[Expression, Type]], None]
+
+
+class TypeMapDispatcher(dict[Expression, Type]):
+    """Replacement of BuildManager.all_types dispatching type maps of checked modules to the hook.
+
+    Mypy updates all_types with the type map of each module at the end of its type checking
+    (see State.finish_passes), so the update is intercepted. The module is taken from the errors
+    reporting context, which mypy sets to the finished module right before that. Types are not
+    accumulated, so BuildResult.types stays empty.
+    """
+
+    def __init__(self, errors: Errors, modules: dict[str, MypyFile], hook: TypeMapHook) -> None:
+        super().__init__()
+        self._errors = errors
+        self._modules = modules
+        self._hook = hook
+
+    def update(self, type_map: dict[Expression, Type]) -> None:  # type: ignore[override]
+        module = self._errors.current_module()
+        if module is not None and module in self._modules:
+            self._hook(self._modules[module], type_map)
+
+
+def build(
+    sources: list[BuildSource],
+    options: Options,
+    type_map_hook: TypeMapHook,
+    alt_lib_path: str | None = None,
+    flush_errors: Callable[[str | None, list[str], bool], None] | None = None,
+    fscache: FileSystemCache | None = None,
+    stdout: TextIO | None = None,
+    stderr: TextIO | None = None,
+    extra_plugins: Sequence[Plugin] | None = None,
+) -> BuildResult:
+    """Analyze a program the same way mypy.build.build() does, passing type maps of checked modules to the hook.
+
+    Types are exported only for the modules type checked in this build (see BuildManager.rechecked_modules),
+    the ones loaded from the incremental cache have no types.
+    """
+    # If we were not given a flush_errors, we use one that will populate those
+    # fields for callers that want the traditional API.
+    messages = []
+
+    def default_flush_errors(
+        filename: str | None, new_messages: list[str], is_serious: bool
+    ) -> None:
+        messages.extend(new_messages)
+
+    flush_errors = flush_errors or default_flush_errors
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    extra_plugins = extra_plugins or []
+
+    try:
+        result = _build(
+            sources,
+            options,
+            type_map_hook,
+            alt_lib_path,
+            flush_errors,
+            fscache,
+            stdout,
+            stderr,
+            extra_plugins,
+        )
+        result.errors = messages
+        return result
+    except CompileError as e:
+        # CompileErrors raised from an errors object carry all of the
+        # messages that have not been reported out by error streaming.
+        # Patch it up to contain either none or all none of the messages,
+        # depending on whether we are flushing errors.
+        serious = not e.use_stdout
+        flush_errors(None, e.messages, serious)
+        e.messages = messages
+        raise
+
+
+def _build(
+    sources: list[BuildSource],
+    options: Options,
+    type_map_hook: TypeMapHook,
+    alt_lib_path: str | None,
+    flush_errors: Callable[[str | None, list[str], bool], None],
+    fscache: FileSystemCache | None,
+    stdout: TextIO,
+    stderr: TextIO,
+    extra_plugins: Sequence[Plugin],
+) -> BuildResult:
+    if platform.python_implementation() == "CPython":
+        # This seems the most reasonable place to tune garbage collection.
+        gc.set_threshold(150 * 1000)
+
+    # The type maps are exported by mypy only if requested.
+    options.export_types = True
+
+    data_dir = default_data_dir()
+    fscache = fscache or FileSystemCache()
+
+    search_paths = compute_search_paths(sources, options, data_dir, alt_lib_path)
+
+    # Reports are not supported: any reporter disables the incremental cache.
+    source_set = BuildSourceSet(sources)
+    cached_read = fscache.read
+    errors = Errors(options, read_source=lambda path: read_py_file(path, cached_read))
+    plugin, snapshot = load_plugins(options, errors, stdout, extra_plugins)
+
+    # Add catch-all .gitignore to cache dir if we created it
+    cache_dir_existed = os.path.isdir(options.cache_dir)
+
+    # Construct a build manager object to hold state during the build.
+    #
+    # Ignore current directory prefix in error messages.
+    manager = BuildManager(
+        data_dir,
+        search_paths,
+        ignore_prefix=os.getcwd(),
+        source_set=source_set,
+        reports=None,
+        options=options,
+        version_id=__version__,
+        plugin=plugin,
+        plugins_snapshot=snapshot,
+        errors=errors,
+        error_formatter=None if options.output is None else OUTPUT_CHOICES.get(options.output),
+        flush_errors=flush_errors,
+        fscache=fscache,
+        stdout=stdout,
+        stderr=stderr,
+    )
+    manager.all_types = TypeMapDispatcher(errors, manager.modules, type_map_hook)
+    if manager.verbosity() >= 2:
+        manager.trace(repr(options))
+
+    reset_global_state()
+    try:
+        graph = dispatch(sources, manager, stdout)
+        if not options.fine_grained_incremental:
+            type_state.reset_all_subtype_caches()
+        if options.timing_stats is not None:
+            dump_timing_stats(options.timing_stats, graph)
+        if options.line_checking_stats is not None:
+            dump_line_checking_stats(options.line_checking_stats, graph)
+        return BuildResult(manager, graph)
+    finally:
+        t0 = time.time()
+        manager.metastore.commit()
+        manager.add_stats(cache_commit_time=time.time() - t0)
+        manager.log(
+            "Build finished in %.3f seconds with %d modules, and %d errors"
+            % (
+                time.time() - manager.start_time,
+                len(manager.modules),
+                manager.errors.num_messages(),
+            )
+        )
+        manager.dump_stats()
+        if not cache_dir_existed and os.path.isdir(options.cache_dir):
+            add_catch_all_gitignore(options.cache_dir)
+            exclude_from_backups(options.cache_dir)
+        if os.path.isdir(options.cache_dir):
+            record_missing_stub_packages(options.cache_dir, manager.missing_stub_packages)
@@ -1,11 +1,34 @@
 """Dora configuration options."""
 
 import argparse
-
-from mypy.build import BuildSource
-from mypy.find_sources import create_source_list
-from mypy.main import process_options
-from mypy.options import Options as MypyOptions
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from dora.profile import Profile
+
+if TYPE_CHECKING:
+    from mypy.build import BuildSource
+    from mypy.options import Options as MypyOptions
+
+# Dora options taken from the parsed arguments as is. Options without arguments of the command keep their defaults.
+ARGUMENT_OPTIONS = (
+    'color',
+    'output_format',
+    'with_source',
+    'show_mypy_errors',
+    'paths',
+    'use_index',
+    'daemon_socket',
+    'stream',
+    'prefilter',
+    'jobs',
+    'release_types',
+    'debug',
+    'profile',
+    'trace_out',
+    'memory_report',
+)
 
 
 class DoraOptions:
@@ -16,46 +39,195 @@ class DoraOptions:
         # Use ANSI color codes for results highlighting.
         self.color = True
 
+        # Format of the search results: human readable `text`, `jsonl` or `binary`.
+        self.output_format = 'text'
+
+        # Include lines of the source file with the found expression in machine readable formats.
+        self.with_source = False
+
         # Show mypy errors after the search results.
         self.show_mypy_errors = False
 
-        # The type expression to search for.
-        self.type_expression = None
+        # The type expressions to search for. If empty, all types are listed.
+        self.type_expressions: list[str] = []
+
+        # Class names of the expressions to search in. If empty, all expressions are searched.
+        self.node_kinds: list[str] = []
+
+        # The source files and directories as given on the command line.
+        self.paths: list[str] = []
 
         # The sources to search in.
         self.sources: list[BuildSource] = []
 
+        # Answer the search from the index built by `dora index` if it is up to date.
+        self.use_index = True
+
+        # Unix socket of `dora daemon` to send the search to.
+        self.daemon_socket: str | None = None
+
+        # Print results of each module as soon as it is type checked instead of in the sources order.
+        self.stream = False
+
+        # Type check only the source files importing modules of the searched types.
+        self.prefilter = False
+
+        # Number of worker processes searching in shards of the source files.
+        self.jobs = 1
+
+        # Don't keep types of the searched modules once they are collected, at the cost of rendering them again.
+        self.release_types = False
+
+        # Print the search statistics after the search results.
+        self.debug = False
+
+        # Print the phases times and the slowest modules after the search results.
+        self.profile = False
+
+        # Path to write the trace of the search phases and processing of each module to.
+        self.trace_out: str | None = None
 
-def parse_cli_options(parser: argparse.ArgumentParser, args: list[str]) -> tuple[DoraOptions, MypyOptions]:
+        # Print memory usage after each phase attributed to the data structures holding it.
+        self.memory_report = False
+
+
+def parse_cli_options(
+    parser: argparse.ArgumentParser,
+    args: list[str],
+    profile: Profile | None = None,
+) -> tuple[DoraOptions, 'MypyOptions']:
     """Parse command line arguments to Dora and Mypy options with a little trickery.
 
     Args before '--' correspond to Dora options, and args after '--' correspond to Mypy options.
     As argparse does not support '--' as we need it, we have to do some trickery to get the desired behavior.
+    Dora options without arguments of the command, e.g. search options of `dora index`, keep their defaults.
 
+    Dora arguments are parsed and validated before mypy is imported, so help and usage errors are shown fast.
     This function may produce mypy arguments parsing error and exit with a traceback if the mypy arguments are invalid.
     TODO: pass custom stdout to capture the traceback and handle it gracefully in the dora entry point.
 
     Args:
         parser (argparse.ArgumentParser): The Dora CLI argument parser.
         args (list[str]): The command line arguments. Assume executable is trimmed.
+        profile (Profile | None): Profile to add the time of finding the source files to.
 
     Returns:
         Dora and Mypy options.
     """
     try:
         rest_sep = args.index('--')
-        dora_args, mypy_args = args[:rest_sep], args[rest_sep + 1:]
     except ValueError:
-        dora_args, mypy_args = args, []
+        rest_sep = len(args)
+
+    ns = parser.parse_args(args[:rest_sep])
+    dora_options = _argument_options(ns)
+    dora_options.type_expressions = _type_expressions(parser, ns)
+    dora_options.node_kinds = _node_kinds(parser, ns)
+    _check_options(parser, dora_options)
+
+    # Mypy is imported only when the search is going to run.
+    from mypy.find_sources import create_source_list
+    from mypy.main import process_options
 
     # mypy requires at least one file to be specified, so we pass dummy 'stub.py'
-    _, mypy_options = process_options(mypy_args + ['stub.py'])
+    mypy_args = args[rest_sep + 1:]
+    _, mypy_options = process_options([*mypy_args, 'stub.py'])
+    with (profile or Profile()).phase('find sources'):
+        dora_options.sources = create_source_list(dora_options.paths, mypy_options)
+
+    return dora_options, mypy_options
+
 
-    ns = parser.parse_args(dora_args)
+def _argument_options(ns: argparse.Namespace) -> DoraOptions:
+    """Take the options given by the arguments as is.
+
+    Args:
+        ns: The parsed arguments.
+
+    Returns:
+        Dora options, the default ones for the arguments the command doesn't have.
+    """
     dora_options = DoraOptions()
-    dora_options.color = ns.color
-    dora_options.show_mypy_errors = ns.show_mypy_errors
-    dora_options.type_expression = ns.type_expression
-    dora_options.sources = create_source_list(ns.paths, mypy_options)
+    for name in ARGUMENT_OPTIONS:
+        if name in ns:
+            setattr(dora_options, name, getattr(ns, name))
 
-    return dora_options, mypy_options
+    return dora_options
+
+
+def _type_expressions(parser: argparse.ArgumentParser, ns: argparse.Namespace) -> list[str]:
+    """Get the type expressions given by the arguments and read from the query file.
+
+    Args:
+        parser: The Dora CLI argument parser, used to report errors.
+        ns: The parsed arguments.
+
+    Returns:
+        The type expressions.
+    """
+    type_expressions = list(getattr(ns, 'type_expressions', None) or [])
+    query_file = getattr(ns, 'query_file', None)
+    if query_file is None:
+        return type_expressions
+
+    try:
+        query_text = Path(query_file).read_text()
+    except OSError as e:
+        error = 'Cannot read the query file "{path}": {error}'.format(path=query_file, error=e.strerror)
+        parser.error(error)
+
+    lines = [line.strip() for line in query_text.splitlines()]
+    type_expressions.extend(line for line in lines if line)
+    return type_expressions
+
+
+def _node_kinds(parser: argparse.ArgumentParser, ns: argparse.Namespace) -> list[str]:
+    """Get the node kinds given by the comma-separated arguments.
+
+    Args:
+        parser: The Dora CLI argument parser, used to report errors.
+        ns: The parsed arguments.
+
+    Returns:
+        Class names of the expressions to search in.
+    """
+    node_kinds = [
+        kind.strip()
+        for kinds in getattr(ns, 'node_kinds', None) or []
+        for kind in kinds.split(',')
+        if kind.strip()
+    ]
+    if not node_kinds:
+        return node_kinds
+
+    # The node kinds are taken from mypy, which is slow to import.
+    from dora.query import NODE_KINDS
+
+    for kind in node_kinds:
+        if kind not in NODE_KINDS:
+            known = ', '.join(sorted(NODE_KINDS))
+            parser.error('Unknown node kind "{kind}", expected one of: {kinds}'.format(kind=kind, kinds=known))
+
+    return node_kinds
+
+
+def _check_options(parser: argparse.ArgumentParser, dora_options: DoraOptions) -> None:
+    """Check the options not validated by the parser itself.
+
+    Args:
+        parser: The Dora CLI argument parser, used to report errors.
+        dora_options: The parsed options.
+    """
+    if dora_options.jobs < 1:
+        parser.error('The number of jobs must be positive.')
+
+    # Workers search their shards to the end and don't report their caches and memory.
+    serial_flags = {'--stream': dora_options.stream, '--debug': dora_options.debug, '--memory-report': dora_options.memory_report}
+    if dora_options.jobs > 1:
+        for flag, enabled in serial_flags.items():
+            if enabled:
+                parser.error('The {flag} flag cannot be used with --jobs.'.format(flag=flag))
+
+    missing = [path for path in dora_options.paths if not os.path.exists(path)]
+    if missing:
+        parser.error('The path "{path}" does not exist.'.format(path=missing[0]))
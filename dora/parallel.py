@@ -0,0 +1,227 @@
+"""Search in independent shards of the source files in worker processes."""
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Generator
+
+from mypy.build import BuildSource
+from mypy.errors import CompileError
+from mypy.options import Options as MypyOptions
+
+from dora.dependencies import Dependency, list_dependencies
+from dora.options import DoraOptions
+from dora.prefilter import prefilter_sources
+from dora.profile import Profile
+from dora.result import SearchResult
+from dora.search import search
+
+# Build source fields passed to the workers, as BuildSource cannot be pickled.
+SourceFields = tuple[
+    str | None,
+    str,
+    str | None,
+    str | None,
+    bool,
+]
+
+# Mypy errors, search results or None if the errors blocked type checking, dependencies of the shard
+# and the worker profile.
+ShardResult = tuple[
+    list[str],
+    list[SearchResult] | None,
+    list[Dependency],
+    Profile | None,
+]
+
+# Search results of a shard by their source files.
+FileResults = dict[str, list[SearchResult]]
+
+
+class ParallelSearch:
+    """Search in shards of the source files, each type checked by a worker process.
+
+    Each worker type checks its shard with the modules the shard imports, including files of other shards,
+    but collects types of its shard only. Results are merged in the order of the source files.
+    """
+
+    def __init__(self, dora_options: DoraOptions, mypy_options: MypyOptions, profile: Profile | None = None) -> None:
+        """Split the source files into shards.
+
+        Args:
+            dora_options: Dora options with the number of jobs.
+            mypy_options: Mypy options.
+            profile: Profile to add the modules statistics and the trace of the workers to.
+        """
+        self._dora_options = dora_options
+        self._mypy_options = mypy_options
+        self._profile = profile
+        self._sources = dora_options.sources
+        if dora_options.prefilter:
+            self._sources = prefilter_sources(self._sources, dora_options.type_expressions, mypy_options)
+
+        self._shards = shard_sources(self._sources, dora_options.jobs)
+        self._shard_ids = {
+            source.module: shard_id
+            for shard_id, shard in enumerate(self._shards)
+            for source in shard
+        }
+        # Mypy errors of the finished shards, filled while the results are consumed.
+        self.errors: list[str] = []
+        # Source files of the modules the finished shards depend on by their paths, other shards excluded.
+        self.dependencies: dict[str, Dependency] = {}
+        self._source_paths = frozenset(source.path for source in self._sources)
+
+    def search_results(self) -> Generator[SearchResult, None, None]:
+        """Run the workers and yield the results of each source file as soon as its shard is searched.
+
+        Yields:
+            Found occurrences of the type expressions ordered as the sources.
+
+        Raises:
+            CompileError: If type checking of a shard is blocked by errors.
+        """
+        with ProcessPoolExecutor(max_workers=max(len(self._shards), 1)) as executor:
+            futures = self._submit(executor)
+            # Results of the finished shards.
+            found: dict[int, FileResults] = {}
+            for source in self._sources:
+                shard_id = self._shard_ids[source.module]
+                if shard_id not in found:
+                    found[shard_id] = self._collect(futures[shard_id])
+
+                if source.path is not None:
+                    yield from found[shard_id].pop(source.path, [])
+
+    def _submit(self, executor: ProcessPoolExecutor) -> list['Future[ShardResult]']:
+        # Sources of the shards are passed separately and are already prefiltered.
+        worker_options = DoraOptions()
+        worker_options.type_expressions = self._dora_options.type_expressions
+        worker_options.node_kinds = self._dora_options.node_kinds
+        worker_options.release_types = self._dora_options.release_types
+        options_snapshot = self._mypy_options.snapshot()
+        trace = None if self._profile is None else self._profile.tracing
+        return [
+            executor.submit(
+                _search_shard,
+                worker_options,
+                options_snapshot,
+                [
+                    (source.path, source.module, source.text, source.base_dir, source.followed)
+                    for source in shard
+                ],
+                trace,
+            )
+            for shard in self._shards
+        ]
+
+    def _collect(self, future: 'Future[ShardResult]') -> FileResults:
+        errors, search_results, shard_dependencies, profile = future.result()
+        if self._profile is not None and profile is not None:
+            self._profile.merge(profile)
+
+        if search_results is None:
+            raise CompileError(errors)
+
+        self.errors.extend(error for error in errors if error not in self.errors)
+        self.dependencies.update(
+            (dependency[0], dependency)
+            for dependency in shard_dependencies
+            if dependency[0] not in self._source_paths
+        )
+        return _by_path(search_results)
+
+
+def shard_sources(sources: list[BuildSource], jobs: int) -> list[list[BuildSource]]:
+    """Split the source files into shards of about the same total size.
+
+    Shards are consecutive runs of the source files, so files of the same package, which likely import
+    each other, are mostly type checked by the same worker.
+
+    Args:
+        sources: The source files.
+        jobs: Maximum number of shards.
+
+    Returns:
+        Non-empty shards with the source files in the original order.
+    """
+    sizes = [_source_size(source) for source in sources]
+    shard_ids = _shard_ids(sizes, min(jobs, len(sources)))
+    shards: dict[int, list[BuildSource]] = {}
+    for source, shard_id in zip(sources, shard_ids):
+        shards.setdefault(shard_id, []).append(source)
+
+    return list(shards.values())
+
+
+def _shard_ids(sizes: list[int], shards: int) -> list[int]:
+    """Assign the files laid out in a row to equal parts of the row by the middles of the files.
+
+    Args:
+        sizes: Positive sizes of the files.
+        shards: Number of shards.
+
+    Returns:
+        Shard ids of the files, not decreasing.
+    """
+    total = sum(sizes)
+    shard_ids = []
+    start = 0
+    for size in sizes:
+        # Doubled positions keep the arithmetic in integers.
+        middle = 2 * start + size
+        shard_ids.append(middle * shards // (2 * total))
+        start += size
+
+    return shard_ids
+
+
+def _search_shard(
+    dora_options: DoraOptions,
+    options_snapshot: dict[str, Any],
+    sources_fields: list[SourceFields],
+    trace: bool | None = None,
+) -> ShardResult:
+    """Search in the shard, run in a worker process.
+
+    Args:
+        dora_options: Dora options with the type expressions and node kinds to search for.
+        options_snapshot: Snapshot of mypy options.
+        sources_fields: The source files of the shard.
+        trace: Profile the worker, tracing processing of each module if true. Not profiled if None.
+
+    Returns:
+        Mypy errors, search results or None if the errors blocked type checking, dependencies of the shard
+        and the worker profile.
+    """
+    dora_options.sources = [BuildSource(*fields) for fields in sources_fields]
+    mypy_options = MypyOptions().apply_changes(options_snapshot)
+    profile = None
+    if trace is not None:
+        profile = Profile(trace, 'dora worker {pid}'.format(pid=os.getpid()))
+
+    try:
+        errors, graph, search_results = search(dora_options, mypy_options, profile=profile)
+    except CompileError as e:
+        # Compile errors are not restored properly from pickle.
+        return e.messages, None, [], profile
+
+    return errors, list(search_results), list_dependencies(graph, dora_options.sources), profile
+
+
+def _by_path(search_results: list[SearchResult]) -> FileResults:
+    by_path: FileResults = {}
+    for search_result in search_results:
+        by_path.setdefault(search_result.path, []).append(search_result)
+
+    return by_path
+
+
+def _source_size(source: BuildSource) -> int:
+    # Empty and unreadable files still take some time, so they are spread over the shards as well.
+    if source.path is None:
+        return 1
+
+    try:
+        return os.path.getsize(source.path) or 1
+    except OSError:
+        return 1
@@ -0,0 +1,216 @@
+"""Syntactic prefilter of the source files that cannot contain searched types."""
+
+import itertools
+import os
+import re
+from importlib.util import resolve_name
+from typing import Iterator
+
+from mypy.build import BuildSource
+from mypy.modulefinder import load_stdlib_py_versions
+from mypy.options import Options as MypyOptions
+
+from dora.query import TypeQuery
+
+# Import statements: module of `from ... import ...` with the imported names, or names of `import ...`.
+_IMPORT_PATTERN = re.compile(
+    r'(?:^|[:;])[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(\([^)]*\)|[^\n#;]*)|import[ \t]+([^\n#;]*))',
+    re.MULTILINE,
+)
+
+
+def prefilter_sources(sources: list[BuildSource], type_expressions: list[str], mypy_options: MypyOptions) -> list[BuildSource]:
+    """Select the source files that may contain the searched types.
+
+    A type defined outside of the standard library can only appear in a module that imports the module
+    defining it, directly or through other source modules. Imports are scanned without type checking,
+    so types reaching the module only through imports of third-party modules are missed.
+
+    Args:
+        sources: The source files to search in.
+        type_expressions: The type expressions to search for.
+        mypy_options: Mypy options.
+
+    Returns:
+        The source files that may contain the types, in the original order.
+    """
+    queries_names = _queries_names(type_expressions, mypy_options)
+    if not queries_names:
+        return sources
+
+    graph = ImportGraph(sources)
+    selected: set[str] = set()
+    for names in queries_names:
+        selected.update(set.intersection(*map(graph.importers, names)))
+
+    return [source for source in sources if source.module in selected]
+
+
+class ImportGraph:
+    """Modules imported by the source modules, scanned without type checking."""
+
+    def __init__(self, sources: list[BuildSource]) -> None:
+        """Scan imports of the source modules.
+
+        Args:
+            sources: The source files.
+        """
+        self.sources = {source.module for source in sources}
+        # Modules importing each module, unscannable sources import everything.
+        self._importers: dict[str, set[str]] = {}
+        self._unscanned: set[str] = set()
+        for source in sources:
+            imports = _imported_modules(source)
+            if imports is None:
+                self._unscanned.add(source.module)
+                continue
+
+            for module in imports:
+                self._importers.setdefault(module, set()).add(source.module)
+
+    def importers(self, name: str) -> set[str]:
+        """Find source modules importing the module defining the name, directly or through other source modules.
+
+        Args:
+            name: Fully-qualified name, e.g. `main.User`.
+
+        Returns:
+            Source modules that may refer to the name.
+        """
+        targets = self._defining_modules(name)
+        found = self._unscanned | self.sources.intersection(targets)
+        queue = list(targets)
+        while queue:
+            for importer in self._importers.get(queue.pop(), ()):
+                if importer not in found:
+                    found.add(importer)
+                    queue.append(importer)
+
+        return found
+
+    def _defining_modules(self, name: str) -> list[str]:
+        prefixes = _prefixes(name)
+        defined_in = [module for module in prefixes if module in self.sources]
+        # The name is defined in the innermost source module, otherwise in a third-party package or its submodule.
+        return defined_in[-1:] or prefixes
+
+
+def _imported_modules(source: BuildSource) -> set[str] | None:
+    """Scan modules imported by the source module, including parent packages of the imported ones.
+
+    Import statements are found by a pattern instead of parsing the whole file, so import-like text
+    in strings is taken as imports too, which only makes the prefilter less selective.
+
+    Args:
+        source: The source file.
+
+    Returns:
+        Imported modules, or None if the file cannot be read.
+    """
+    if source.path is None:
+        return None
+
+    try:
+        with open(source.path, 'r', errors='replace') as f:
+            text = f.read()
+    except OSError:
+        return None
+
+    # Relative imports are resolved against the package of the module.
+    package = source.module
+    if not os.path.basename(source.path).startswith('__init__.'):
+        package = package.rpartition('.')[0]
+
+    modules: set[str] = set()
+    for match in _IMPORT_PATTERN.finditer(text):
+        modules.update(_statement_imports(match, package))
+
+    # Parent packages of the module are loaded with it, but don't bind names in it, so they are not imports.
+    modules.discard(source.module)
+    return modules
+
+
+def _queries_names(type_expressions: list[str], mypy_options: MypyOptions) -> list[set[str]]:
+    """Find fully-qualified names of each type expression defined outside of the standard library.
+
+    Args:
+        type_expressions: The type expressions to search for.
+        mypy_options: Mypy options.
+
+    Returns:
+        The names of each type expression, a matching type contains all of them.
+        Empty if some type expression has no such names, so its types may be anywhere.
+    """
+    stdlib = load_stdlib_py_versions(mypy_options.custom_typeshed_dir)
+    queries_names: list[set[str]] = []
+    for type_expression in type_expressions:
+        names = {
+            name
+            for name in TypeQuery(type_expression).names
+            if name.partition('.')[0] not in stdlib
+        }
+        if not names:
+            return []
+
+        queries_names.append(names)
+
+    return queries_names
+
+
+def _statement_imports(match: re.Match[str], package: str) -> Iterator[str]:
+    """List modules imported by the import statement, including parent packages of the imported ones.
+
+    Args:
+        match: The import statement matched by the import pattern.
+        package: Package of the importing module.
+
+    Yields:
+        The imported modules.
+    """
+    base, from_names, import_names = match.groups()
+    if import_names is not None:
+        for name in _split_names(import_names):
+            yield from _prefixes(name)
+
+        return
+
+    try:
+        base = resolve_name(base, package)
+    except ImportError:
+        # Relative imports beyond the top-level package are taken as absolute.
+        base = base.lstrip('.')
+
+    if base:
+        yield from _prefixes(base)
+        # Imported names may be submodules.
+        for name in _split_names(from_names):
+            yield '{base}.{name}'.format(base=base, name=name)
+
+
+def _split_names(names: str) -> list[str]:
+    """Split imported names list dropping aliases.
+
+    Args:
+        names: Names of the import statement, e.g. `a.b as c, d` or `(a,\n b)`.
+
+    Returns:
+        The imported names, e.g. `a.b` and `d`.
+    """
+    # First words of the names, aliases follow them.
+    first_words = [
+        name.split()[:1]
+        for name in names.strip('()').split(',')
+    ]
+    return [word for words in first_words for word in words if word != '*']
+
+
+def _prefixes(name: str) -> list[str]:
+    """List dotted prefixes of the name from the shortest one.
+
+    Args:
+        name: Dotted name, e.g. `a.b.c`.
+
+    Returns:
+        The prefixes including the name itself, e.g. `a`, `a.b` and `a.b.c`.
+    """
+    return list(itertools.accumulate(name.split('.'), '{0}.{1}'.format))
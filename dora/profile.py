@@ -0,0 +1,431 @@
+"""Timing of the search phases and statistics of the searched modules.
+
+Timings may also be recorded as a trace in the Chrome trace event format, viewable with Perfetto UI
+or chrome://tracing. Spans are timestamped with the system-wide monotonic clock, so spans recorded
+by worker processes are merged into the trace of the main process as is.
+"""
+
+import io
+import itertools
+import json
+import operator
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    Iterable,
+    TextIO,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from mypy.options import Options as MypyOptions
+
+_T = TypeVar('_T')
+
+# Mypy log message about a strongly connected component of modules and the start of its processing.
+SccStart = tuple[str, float]
+
+# Trace timestamps are in microseconds, as well as mypy processing times of modules.
+MICROSECONDS = 1e6
+
+PHASES_HEADER = '{phase:<32} {wall:>9} {cpu:>9}'
+PHASE_LINE = '{phase:<32} {wall:>9.3f} {cpu:>9.3f}'
+MODULES_HEADER = '{module:<40} {check:>9} {search:>9} {nodes:>8} {rendered:>8} {hits:>8}'
+MODULE_LINE = '{module:<40} {check:>9.3f} {search:>9.3f} {nodes:>8} {rendered:>8} {hits:>8}'
+
+
+class PhaseTime:
+    """Wall and CPU time spent in a phase, summed over its runs."""
+
+    def __init__(self, name: str, depth: int) -> None:
+        """Initialize empty phase.
+
+        Args:
+            name: The phase name.
+            depth: Number of phases the phase is nested in.
+        """
+        self.name = name
+        self.depth = depth
+        self.wall: float = 0
+        self.cpu: float = 0
+
+    def add(self, wall: float, cpu: float) -> float:
+        """Add the time since the start of a run of the phase.
+
+        Args:
+            wall: Start of the run, time.perf_counter() value.
+            cpu: Start of the run, time.process_time() value.
+
+        Returns:
+            End of the run, time.perf_counter() value.
+        """
+        end = time.perf_counter()
+        self.wall += end - wall
+        self.cpu += time.process_time() - cpu
+        return end
+
+
+class ModuleStats:
+    """Search statistics of a module."""
+
+    def __init__(self, module: str) -> None:
+        """Initialize empty statistics.
+
+        Args:
+            module: The module id.
+        """
+        self.module = module
+        # Mypy processing time excluding collection of the module types.
+        self.check_time: float = 0
+        # Time of collecting and matching the module types.
+        self.search_time: float = 0
+        # Expressions visited in the module tree.
+        self.nodes = 0
+        # Distinct types rendered while collecting the module types.
+        self.rendered = 0
+        # Found occurrences of the type expressions.
+        self.hits = 0
+
+    @property
+    def total_time(self) -> float:
+        """Time of both type checking and searching the module."""
+        return self.check_time + self.search_time
+
+    def count_hits(self, search_results: Iterable[_T]) -> Generator[_T, None, None]:
+        """Count the found occurrences of the type expressions in the module while they are consumed.
+
+        Args:
+            search_results: Search results of the module.
+
+        Yields:
+            The search results.
+        """
+        for search_result in search_results:
+            self.hits += 1
+            yield search_result
+
+
+class Trace:
+    """Spans of the search phases and of mypy processing in the Chrome trace event format."""
+
+    def __init__(self, process_name: str = 'dora') -> None:
+        """Initialize the trace of the process.
+
+        Args:
+            process_name: Name of the process shown in the trace.
+        """
+        process_event = {
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': os.getpid(),
+            'tid': 0,
+            'args': {'name': process_name},
+        }
+        self.events: list[dict[str, Any]] = [process_event]
+        # End of the last traced step of mypy build, the next module type checking starts there.
+        self.checkpoint = time.perf_counter()
+        self._scc: SccStart | None = None
+
+    def span(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        args: dict[str, Any] | None = None,
+    ) -> None:
+        """Add a span to the trace.
+
+        Args:
+            name: The span name.
+            category: The span category, e.g. `phase` or `module`.
+            start: Start of the span, time.perf_counter() value.
+            end: End of the span, time.perf_counter() value.
+            args: Details shown for the span.
+        """
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start * MICROSECONDS,
+            'dur': (end - start) * MICROSECONDS,
+            'pid': os.getpid(),
+            'tid': 0,
+        }
+        if args:
+            event['args'] = args
+
+        self.events.append(event)
+
+    def start_scc(self, message: str) -> None:
+        """Start a span of mypy processing of a strongly connected component of modules, ending the previous one.
+
+        Args:
+            message: Mypy log message about the component.
+        """
+        now = time.perf_counter()
+        self.end_scc()
+        self._scc = (message, now)
+        self.checkpoint = now
+
+    def end_scc(self) -> None:
+        """End the span of the processed strongly connected component of modules."""
+        if self._scc is not None:
+            message, start = self._scc
+            self.span('SCC', 'scc', start, time.perf_counter(), {'mypy': message})
+            self._scc = None
+
+    @contextmanager
+    def mypy_build(self, mypy_options: 'MypyOptions', enabled: bool = True) -> Generator[TextIO | None, None, None]:
+        """Trace the strongly connected components of modules processed by mypy build in the context.
+
+        Processed components are known from mypy log only, so mypy verbosity is raised while the build runs.
+
+        Args:
+            mypy_options: Mypy options of the build.
+            enabled: Trace the build, otherwise the context does nothing.
+
+        Yields:
+            The stream to pass as mypy build stderr, forwarding the log to stderr if mypy verbose output is requested.
+            None if the build isn't traced.
+        """
+        if not enabled:
+            yield None
+            return
+
+        verbosity = mypy_options.verbosity
+        mypy_options.verbosity = max(verbosity, 1)
+        self.checkpoint = time.perf_counter()
+        forward = sys.stderr if verbosity else None
+        try:
+            yield MypyLogTrace(self, forward)
+        finally:
+            mypy_options.verbosity = verbosity
+            self.end_scc()
+
+    def groups(
+        self,
+        name: str,
+        elements: Iterable[_T],
+        key: Callable[[_T], str],
+    ) -> Generator[_T, None, None]:
+        """Trace a span for each run of the elements with the same key, e.g. search results of a file.
+
+        The span of a run lasts from its first element to the first element of the next run, so it includes
+        both producing the elements and consuming them.
+
+        Args:
+            name: Prefix of the span names followed by the key.
+            elements: The elements.
+            key: The key of an element.
+
+        Yields:
+            The elements.
+        """
+        for group_key, group in itertools.groupby(elements, key):
+            start = time.perf_counter()
+            yield from group
+            # The group is exhausted once the first element of the next one is produced.
+            span_name = '{name} {key}'.format(name=name, key=group_key)
+            self.span(span_name, 'file', start, time.perf_counter())
+
+    def save(self, path: str) -> None:
+        """Write the trace in the Chrome trace event format.
+
+        Args:
+            path: The trace file path.
+
+        Raises:
+            OSError: If the file cannot be written.
+        """
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+class Profile:
+    """Wall and CPU time of the search phases and statistics of the searched modules."""
+
+    def __init__(self, trace: bool = False, process_name: str = 'dora') -> None:
+        """Initialize empty profile.
+
+        Args:
+            trace: Record processing of each module as trace spans.
+            process_name: Name of the process shown in the trace.
+        """
+        self.phases: dict[str, PhaseTime] = {}
+        self.modules: dict[str, ModuleStats] = {}
+        # Phases are always traced, modules and mypy processing only if requested.
+        self.tracing = trace
+        self.trace = Trace(process_name)
+        self._depth = 0
+
+    @contextmanager
+    def phase(self, name: str, span: str | None = None) -> Generator[None, None, None]:
+        """Measure the time of the code in the context, adding it to the phase.
+
+        Phases entered in the context are reported as nested in the phase.
+
+        Args:
+            name: The phase name.
+            span: Name of the trace span of this run of the phase, the phase name by default.
+                If empty, the run is not traced.
+
+        Yields:
+            Nothing.
+        """
+        phase_time = self.phases.get(name)
+        if phase_time is None:
+            phase_time = PhaseTime(name, self._depth)
+            self.phases[name] = phase_time
+
+        self._depth += 1
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self._end_phase(phase_time, (wall, cpu), span)
+
+    def timed(self, name: str, elements: Iterable[_T]) -> Generator[_T, None, None]:
+        """Add the time of producing the elements by a lazy iterable to the phase.
+
+        Args:
+            name: The phase name.
+            elements: The elements, e.g. search results consumed while they are rendered.
+
+        Yields:
+            The elements.
+        """
+        iterator = iter(elements)
+        while True:
+            with self.phase(name, span=''):
+                try:
+                    element = next(iterator)
+                except StopIteration:
+                    return
+
+            yield element
+
+    def merge(self, other: 'Profile') -> None:
+        """Add the modules statistics and the trace of a worker process profile.
+
+        Args:
+            other: The worker profile.
+        """
+        self.modules.update(other.modules)
+        self.trace.events.extend(other.trace.events)
+
+    def module(self, module: str) -> ModuleStats:
+        """Get statistics of the module, creating empty ones on the first access.
+
+        Args:
+            module: The module id.
+
+        Returns:
+            The module statistics.
+        """
+        stats = self.modules.get(module)
+        if stats is None:
+            stats = ModuleStats(module)
+            self.modules[module] = stats
+
+        return stats
+
+    def report(self, slowest: int = 10) -> str:
+        """Report the phases times and the slowest modules.
+
+        Args:
+            slowest: Number of the slowest modules to report.
+
+        Returns:
+            Human readable statistics.
+        """
+        lines = [PHASES_HEADER.format(phase='Phase', wall='Wall, s', cpu='CPU, s')]
+        lines.extend(map(_phase_line, self.phases.values()))
+        if not self.modules:
+            return '\n'.join(lines)
+
+        lines.append('')
+        lines.append(MODULES_HEADER.format(
+            module='Slowest modules',
+            check='Check, s',
+            search='Search, s',
+            nodes='Nodes',
+            rendered='Rendered',
+            hits='Hits',
+        ))
+        modules = list(self.modules.values())
+        modules.sort(key=operator.attrgetter('total_time'), reverse=True)
+        lines.extend(map(_module_line, modules[:slowest]))
+        return '\n'.join(lines)
+
+    def _end_phase(self, phase_time: PhaseTime, start: tuple[float, float], span: str | None) -> None:
+        wall, cpu = start
+        end = phase_time.add(wall, cpu)
+        if span != '':
+            self.trace.span(span or phase_time.name, 'phase', wall, end)
+
+
+class MypyLogTrace(io.StringIO):
+    """Mypy log stream starting a trace span for each processed strongly connected component of modules.
+
+    Mypy logs the component right before processing it when its verbosity is at least 1.
+    """
+
+    def __init__(self, trace: Trace, forward: TextIO | None = None) -> None:
+        """Initialize the stream.
+
+        Args:
+            trace: The trace to add the components to.
+            forward: Stream to pass the log to.
+        """
+        super().__init__()
+        self._trace = trace
+        self._forward = forward
+        self._line: list[str] = []
+
+    def write(self, text: str) -> int:
+        """Scan the log text for messages about the processed components.
+
+        Args:
+            text: Part of the log.
+
+        Returns:
+            Length of the text.
+        """
+        if self._forward is not None:
+            self._forward.write(text)
+
+        self._line.append(text)
+        if '\n' in text:
+            log = ''.join(self._line)
+            *lines, last = log.split('\n')
+            self._line = [last]
+            for line in lines:
+                message = line.removeprefix('LOG:').strip()
+                if message.startswith('Processing SCC'):
+                    self._trace.start_scc(message)
+
+        return len(text)
+
+
+def _phase_line(phase_time: PhaseTime) -> str:
+    indented_name = '  ' * phase_time.depth + phase_time.name
+    return PHASE_LINE.format(phase=indented_name, wall=phase_time.wall, cpu=phase_time.cpu)
+
+
+def _module_line(stats: ModuleStats) -> str:
+    return MODULE_LINE.format(
+        module=stats.module,
+        check=stats.check_time,
+        search=stats.search_time,
+        nodes=stats.nodes,
+        rendered=stats.rendered,
+        hits=stats.hits,
+    )
@@ -0,0 +1,209 @@
+"""Type expression queries."""
+
+import inspect
+import re
+from types import MappingProxyType
+
+from mypy import nodes
+from mypy.types import Instance, Type
+
+WILDCARD = '*'
+
+# Fully-qualified names not adjacent to wildcards, which may be parts of longer names.
+_NAME_PATTERN = re.compile(r'(?<![\w.*])[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)+(?![\w.*])')
+_HEAD_PATTERN = re.compile(r'[\w.]+')
+# Brackets and quoted literals, which may contain brackets and escaped quotes.
+# A quote not closed before the end of the text is matched alone.
+_TOKEN_PATTERN = re.compile('|'.join((
+    r'[][()]',
+    r"'(?:\\.|[^'\\])*'",
+    r'"(?:\\.|[^"\\])*"',
+    r'[\'"]',
+)), re.DOTALL)
+
+# Leading words of types rendered by mypy by the type class names, see mypy.types.TypeStrVisitor.
+# Types rendered differently depending on options (e.g. tuples) or context (e.g. aliases) are not listed.
+_HEADS = MappingProxyType({
+    'AnyType': 'Any',
+    'CallableType': 'def',
+    'LiteralType': 'Literal',
+    'NoneType': 'None',
+    'Overloaded': 'Overload',
+    'TypedDictType': 'TypedDict',
+    'UninhabitedType': 'Never',
+    'UnionType': 'Union',
+})
+
+# Class names of expressions that may have types, to filter the search results by.
+NODE_KINDS = frozenset(
+    node_class.__name__
+    for _, node_class in inspect.getmembers(nodes, inspect.isclass)
+    if issubclass(node_class, nodes.Expression) and node_class is not nodes.Expression
+)
+
+_BRACKETS = MappingProxyType({'[': ']', '(': ')'})
+# Closing brackets and quotes of literals not closed, which match no opening bracket.
+_CLOSING = frozenset('])\'"')
+
+
+def type_names(type_expression: str) -> set[str]:
+    """Extract fully-qualified names from the rendered type or type expression.
+
+    Args:
+        type_expression: The rendered type, e.g. `builtins.list[main.User]`.
+
+    Returns:
+        Fully-qualified names mentioned in the type.
+    """
+    return set(_NAME_PATTERN.findall(type_expression))
+
+
+def type_head(node_type: Type) -> str | None:
+    """Get the leading word of the type rendered by mypy without rendering it.
+
+    Args:
+        node_type: The type.
+
+    Returns:
+        Fully-qualified name of instance types, the type kind for other types,
+        or None if it cannot be determined without rendering.
+    """
+    if isinstance(node_type, Instance):
+        if node_type.last_known_value is not None and not node_type.args:
+            return 'Literal'
+
+        return node_type.type.fullname or None
+
+    return _HEADS.get(type(node_type).__name__)
+
+
+class TypeQuery:
+    """Type expression compiled for matching types.
+
+    The type expression is written the same way mypy renders types, e.g. `builtins.list[builtins.int]`.
+    `*` stands for any part of the type with balanced brackets: a type, types list or callable arguments,
+    e.g. `builtins.list[*]` or `def (*) -> main.User`.
+
+    Candidate types are rejected by their class and fully-qualified name before rendering when possible.
+    """
+
+    def __init__(self, type_expression: str | None) -> None:
+        """Compile the type expression.
+
+        Args:
+            type_expression: The type expression to search for. If None, all types match.
+        """
+        self.type_expression = type_expression
+        self._pieces = [] if type_expression is None else type_expression.split(WILDCARD)
+        self.head = self._parse_head(type_expression)
+        self.names = set() if type_expression is None else type_names(type_expression)
+
+    @property
+    def is_exact(self) -> bool:
+        """Check if the query is a single type without wildcards.
+
+        Returns:
+            True if the only matching rendered type is the type expression itself.
+        """
+        return len(self._pieces) == 1
+
+    def rejects(self, node_type: Type) -> bool:
+        """Check if the type surely doesn't match without rendering it.
+
+        Args:
+            node_type: The candidate type.
+
+        Returns:
+            True if the type doesn't match, False if it has to be rendered to decide.
+        """
+        if self.head is None:
+            return False
+
+        head = type_head(node_type)
+        return head is not None and head != self.head
+
+    def match_text(self, rendered: str) -> bool:
+        """Check if the rendered type matches.
+
+        Args:
+            rendered: The type rendered by mypy.
+
+        Returns:
+            True if the type matches.
+        """
+        if self.type_expression is None:
+            return True
+
+        if self.is_exact:
+            return rendered == self.type_expression
+
+        first, *middle, last = self._pieces
+        end = len(rendered) - len(last)
+        if end < len(first):
+            return False
+
+        if not rendered.startswith(first) or not rendered.endswith(last):
+            return False
+
+        return _match_wildcards(rendered, len(first), end, middle)
+
+    @classmethod
+    def _parse_head(cls, type_expression: str | None) -> str | None:
+        if type_expression is None:
+            return None
+
+        head = _HEAD_PATTERN.match(type_expression)
+        if head is None or type_expression.startswith(WILDCARD, head.end()):
+            return None
+
+        return head.group()
+
+
+def _match_wildcards(text: str, start: int, end: int, pieces: list[str]) -> bool:
+    """Match text between wildcards, each wildcard consuming text with balanced brackets.
+
+    Args:
+        text: The rendered type.
+        start: Start of the text consumed by the first wildcard.
+        end: End of the text consumed by the last wildcard.
+        pieces: Literal pieces between the wildcards.
+
+    Returns:
+        True if the text matches.
+    """
+    if not pieces:
+        return _is_balanced(text, start, end)
+
+    piece, rest = pieces[0], pieces[1:]
+    position = text.find(piece, start, end)
+    while position != -1:
+        piece_end = position + len(piece)
+        if _is_balanced(text, start, position) and _match_wildcards(text, piece_end, end, rest):
+            return True
+
+        position = text.find(piece, position + 1, end)
+
+    return False
+
+
+def _is_balanced(text: str, start: int, end: int) -> bool:
+    """Check if brackets are balanced in the text ignoring quoted literals.
+
+    Args:
+        text: The rendered type.
+        start: Start of the checked part.
+        end: End of the checked part.
+
+    Returns:
+        True if every bracket is closed within the part.
+    """
+    # Closing brackets expected after the sentinel, which matches none of them.
+    expected = ['']
+    for token in _TOKEN_PATTERN.findall(text, start, end):
+        closing = _BRACKETS.get(token)
+        if closing is not None:
+            expected.append(closing)
+        elif token in _CLOSING and expected.pop() != token:
+            return False
+
+    return expected == ['']
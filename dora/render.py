@@ -0,0 +1,344 @@
+"""Buffered rendering of search results.
+
+Besides the human readable text, results are written in machine readable formats:
+
+- JSON Lines: an object per result with `path`, `line`, `column`, `end_line`, `end_column`, `node_kind`
+  and `type` keys, `queries` with the matched type expressions if several were searched
+  and `source` with the lines of the expression if requested.
+- Binary: the `DORA` magic, a format version byte and a flags byte (bit 0: results have sources),
+  followed by records of two kinds. A string record is `S`, a little-endian uint32 length and UTF-8 bytes;
+  strings are numbered in the order they are written. A result record is `R`, uint32 path string number,
+  int32 line, column, end line and end column, uint32 node kind and type string numbers, uint16 number
+  of the matched type expressions and their uint32 string numbers, and uint32 source string number if
+  the results have sources. Each string is written once before the first record referring to it.
+"""
+
+import json
+import struct
+import sys
+from typing import Any, BinaryIO, Generator, Iterable, TextIO
+
+from dora.options import DoraOptions
+from dora.result import SearchResult
+from dora.source import SourceCache, SourceFile
+
+
+class ResultsWriter:
+    """Writer of rendered search results in large chunks.
+
+    Results are expected to be grouped by files, so the source file is looked up once per group of results.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        color: bool = False,
+        source_cache: SourceCache | None = None,
+        buffer_results: int = 1000,
+    ) -> None:
+        """Initialize the writer.
+
+        Args:
+            stream: The stream to write to.
+            color: Use ANSI colors to highlight expressions.
+            source_cache: Cache of the source files text. If not provided, a new one is used.
+            buffer_results: Number of results rendered before writing them to the stream.
+        """
+        self.stream = stream
+        self.color = color
+        self.source_cache = SourceCache() if source_cache is None else source_cache
+        self.buffer_results = buffer_results
+        self._parts: list[str] = []
+        self._buffered = 0
+        self._path: str | None = None
+        self._source_file: SourceFile | None = None
+
+    def write(self, search_result: SearchResult) -> None:
+        """Render the search result to the buffer, writing the buffer if it is full.
+
+        Args:
+            search_result: The search result.
+        """
+        self._render(search_result)
+        self._buffered += 1
+        if self._buffered >= self.buffer_results:
+            self.flush()
+
+    def write_all(self, search_results: Iterable[SearchResult]) -> None:
+        """Render and write all the search results.
+
+        Args:
+            search_results: The search results.
+        """
+        for search_result in search_results:
+            self.write(search_result)
+
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered results to the stream."""
+        if self._parts:
+            self.stream.write(''.join(self._parts))
+            self._parts.clear()
+            self._buffered = 0
+
+        self.stream.flush()
+
+    def _render(self, search_result: SearchResult) -> None:
+        search_result.render(self._parts, self._node_text(search_result), self.color)
+        self._parts.append('\n\n')
+
+    def _node_text(self, search_result: SearchResult) -> str:
+        if search_result.path != self._path or self._source_file is None:
+            self._source_file = self.source_cache.get(search_result.path)
+            self._path = search_result.path
+
+        return self._source_file.lines(search_result.line, search_result.end_line)
+
+
+class JsonLinesWriter(ResultsWriter):
+    """Writer of search results as JSON Lines, see the module docstring for the keys."""
+
+    def __init__(
+        self,
+        stream: TextIO,
+        with_source: bool = False,
+        source_cache: SourceCache | None = None,
+        buffer_results: int = 1000,
+    ) -> None:
+        """Initialize the writer.
+
+        Args:
+            stream: The stream to write to.
+            with_source: Include lines of the source file with the found expression.
+            source_cache: Cache of the source files text. If not provided, a new one is used.
+            buffer_results: Number of results rendered before writing them to the stream.
+        """
+        super().__init__(stream, False, source_cache, buffer_results)
+        self.with_source = with_source
+        # Paths, types and tags repeat a lot, so they are encoded once.
+        self._encoded: dict[Any, str] = {}
+
+    def _render(self, search_result: SearchResult) -> None:
+        self._parts.append('{{"path": {path}, "line": {line}, "column": {column}, "end_line": {end_line}, "end_column": {end_column}, "node_kind": {node_kind}, "type": {type}'.format(
+            path=self._encode(search_result.path),
+            line=search_result.line,
+            column=search_result.column,
+            end_line=search_result.end_line,
+            end_column=search_result.end_column,
+            node_kind=self._encode(search_result.node_kind),
+            type=self._encode(search_result.type_expression),
+        ))
+        if search_result.queries:
+            self._parts.append(', "queries": ')
+            self._parts.append(self._encode(search_result.queries))
+
+        if self.with_source:
+            self._parts.append(', "source": ')
+            self._parts.append(json.dumps(self._node_text(search_result)))
+
+        self._parts.append('}\n')
+
+    def _encode(self, field: str | tuple[str, ...]) -> str:
+        encoded = self._encoded.get(field)
+        if encoded is None:
+            encoded = json.dumps(field)
+            self._encoded[field] = encoded
+
+        return encoded
+
+
+_BINARY_MAGIC = b'DORA'
+_BINARY_VERSION = 1
+_BINARY_WITH_SOURCE = 1
+_BINARY_HEADER = struct.Struct('<4sBB')
+_BINARY_STRING = struct.Struct('<cI')
+_BINARY_RESULT = struct.Struct('<cIiiiiIIH')
+# Fields of the result record after its tag.
+_BINARY_RESULT_FIELDS = struct.Struct('<IiiiiIIH')
+_BINARY_ID = struct.Struct('<I')
+
+
+class BinaryWriter:
+    """Writer of search results in the compact binary format, see the module docstring for the layout."""
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        with_source: bool = False,
+        source_cache: SourceCache | None = None,
+        buffer_results: int = 1000,
+    ) -> None:
+        """Initialize the writer and write the format header.
+
+        Args:
+            stream: The binary stream to write to.
+            with_source: Include lines of the source file with the found expression.
+            source_cache: Cache of the source files text. If not provided, a new one is used.
+            buffer_results: Number of results rendered before writing them to the stream.
+        """
+        self.stream = stream
+        self.with_source = with_source
+        self.source_cache = SourceCache() if source_cache is None else source_cache
+        self.buffer_results = buffer_results
+        self._parts: list[bytes] = [_BINARY_HEADER.pack(_BINARY_MAGIC, _BINARY_VERSION, _BINARY_WITH_SOURCE if with_source else 0)]
+        self._buffered = 0
+        self._string_ids: dict[str, int] = {}
+
+    def write(self, search_result: SearchResult) -> None:
+        """Encode the search result to the buffer, writing the buffer if it is full.
+
+        Args:
+            search_result: The search result.
+        """
+        # Strings are written before the record referring to them.
+        query_ids = [self._string_id(query) for query in search_result.queries]
+        source_id = None
+        if self.with_source:
+            lines = self.source_cache.lines(search_result.path, search_result.line, search_result.end_line)
+            source_id = self._string_id(lines)
+
+        record = _BINARY_RESULT.pack(
+            b'R',
+            self._string_id(search_result.path),
+            search_result.line,
+            search_result.column,
+            search_result.end_line,
+            search_result.end_column,
+            self._string_id(search_result.node_kind),
+            self._string_id(search_result.type_expression),
+            len(query_ids),
+        )
+        self._parts.append(record)
+        self._parts.extend(_BINARY_ID.pack(query_id) for query_id in query_ids)
+        if source_id is not None:
+            self._parts.append(_BINARY_ID.pack(source_id))
+
+        self._buffered += 1
+        if self._buffered >= self.buffer_results:
+            self.flush()
+
+    def write_all(self, search_results: Iterable[SearchResult]) -> None:
+        """Encode and write all the search results.
+
+        Args:
+            search_results: The search results.
+        """
+        for search_result in search_results:
+            self.write(search_result)
+
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered results to the stream."""
+        if self._parts:
+            self.stream.write(b''.join(self._parts))
+            self._parts.clear()
+            self._buffered = 0
+
+        self.stream.flush()
+
+    def _string_id(self, string: str) -> int:
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = len(self._string_ids)
+            self._string_ids[string] = string_id
+            encoded = string.encode()
+            self._parts.append(_BINARY_STRING.pack(b'S', len(encoded)))
+            self._parts.append(encoded)
+
+        return string_id
+
+
+def make_writer(dora_options: DoraOptions, source_cache: SourceCache) -> ResultsWriter | BinaryWriter:
+    """Create the writer of search results in the requested format.
+
+    Args:
+        dora_options: Dora options with the output format.
+        source_cache: Cache of the source files text.
+
+    Returns:
+        The writer to stdout.
+    """
+    # Streamed results are written as soon as they are found, others in large chunks.
+    buffer_results = 1 if dora_options.stream else 1000
+    if dora_options.output_format == 'jsonl':
+        return JsonLinesWriter(sys.stdout, dora_options.with_source, source_cache, buffer_results)
+
+    if dora_options.output_format == 'binary':
+        return BinaryWriter(sys.stdout.buffer, dora_options.with_source, source_cache, buffer_results)
+
+    return ResultsWriter(sys.stdout, dora_options.color, source_cache, buffer_results)
+
+
+def read_binary(stream: BinaryIO) -> Generator[dict[str, Any], None, None]:
+    """Read search results written by BinaryWriter.
+
+    Args:
+        stream: The binary stream to read from.
+
+    Yields:
+        Search results with the same keys as in the JSON Lines format.
+
+    Raises:
+        ValueError: If the stream is not in the binary format or is truncated.
+    """
+    reader = _BinaryReader(stream)
+    magic, version, flags = _BINARY_HEADER.unpack(reader.read_exactly(_BINARY_HEADER.size))
+    if magic != _BINARY_MAGIC or version != _BINARY_VERSION:
+        raise ValueError('Not a dora binary results stream.')
+
+    tag = stream.read(1)
+    while tag:
+        if tag == b'S':
+            reader.read_string()
+        elif tag == b'R':
+            yield reader.read_result(bool(flags & _BINARY_WITH_SOURCE))
+        else:
+            raise ValueError('Unknown record {tag!r} in the dora binary results stream.'.format(tag=tag))
+
+        tag = stream.read(1)
+
+
+class _BinaryReader:
+    """Reader of the records of the binary format, keeping the strings read so far."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream = stream
+        self.strings: list[str] = []
+
+    def read_string(self) -> None:
+        length = self.read_ids(1)[0]
+        self.strings.append(self.read_exactly(length).decode())
+
+    def read_result(self, with_source: bool) -> dict[str, Any]:
+        # Path, line, column, end line, end column, node kind, type and number of the matched type expressions.
+        fields = _BINARY_RESULT_FIELDS.unpack(self.read_exactly(_BINARY_RESULT_FIELDS.size))
+        record: dict[str, Any] = {
+            'path': self.strings[fields[0]],
+            'line': fields[1],
+            'column': fields[2],
+            'end_line': fields[3],
+            'end_column': fields[4],
+            'node_kind': self.strings[fields[5]],
+            'type': self.strings[fields[6]],
+        }
+        if fields[7]:
+            query_ids = self.read_ids(fields[7])
+            record['queries'] = [self.strings[query_id] for query_id in query_ids]
+
+        if with_source:
+            record['source'] = self.strings[self.read_ids(1)[0]]
+
+        return record
+
+    def read_ids(self, count: int) -> tuple[int, ...]:
+        ids = self.read_exactly(_BINARY_ID.size * count)
+        return struct.unpack('<{count}I'.format(count=count), ids)
+
+    def read_exactly(self, size: int) -> bytes:
+        chunk = self.stream.read(size)
+        if len(chunk) != size:
+            raise ValueError('Truncated dora binary results stream.')
+
+        return chunk
@@ -0,0 +1,84 @@
+"""Search results."""
+
+import sys
+
+from dora import ansi
+from dora.cache import TypeRow
+from dora.source import SourceCache
+
+# Source files of search results rendered without explicitly provided cache.
+_source_cache = SourceCache()
+
+
+class SearchResult:  # noqa: WPS230
+    """Occurrence of a type expression in a source file.
+
+    Results are plain records that don't reference mypy trees or types, so the build can be freed
+    while the results are rendered. Strings are interned to share them between results.
+    """
+
+    __slots__ = ('path', 'line', 'column', 'end_line', 'end_column', 'node_kind', 'type_expression', 'queries')
+
+    def __init__(self, path: str, row: TypeRow, queries: tuple[str, ...] = ()) -> None:
+        """Initialize the search result.
+
+        Args:
+            path: The source file where the type expression was found.
+            row: Location, node kind and type expression of the found expression.
+            queries: The searched type expressions matching the found one, if several were searched.
+        """
+        self.path = sys.intern(path)
+        self.line = row[0]
+        self.column = row[1]
+        self.end_line = row[2]
+        self.end_column = row[3]
+        self.node_kind = sys.intern(row[4])
+        self.type_expression = sys.intern(row[5])
+        self.queries = queries
+
+    def to_str(self, color: bool = False, source_cache: SourceCache | None = None) -> str:
+        """Render the search result as a string.
+
+        Args:
+            color: Use ANSI colors to highlight expressions.
+            source_cache: Cache of the source files text. If not provided, the shared one is used.
+
+        Returns:
+            A string representation of the search result.
+        """
+        source_cache = _source_cache if source_cache is None else source_cache
+        node_text = source_cache.lines(self.path, self.line, self.end_line)
+        parts: list[str] = []
+        self.render(parts, node_text, color)
+        return ''.join(parts)
+
+    def render(self, parts: list[str], node_text: str, color: bool = False) -> None:
+        """Render the search result to string parts, see SearchResult.to_str.
+
+        Args:
+            parts: The list to append the parts of the rendered result to.
+            node_text: Lines of the source file with the found expression.
+            color: Use ANSI colors to highlight expressions.
+        """
+        column_pointer_offset = ' ' * self.column
+        queries = ''
+        if self.queries:
+            queries = ' matches {queries}'.format(queries=', '.join(map(repr, self.queries)))
+
+        parts.append('{path}:{line}:{column}{queries}\n{offset}{type_expression} ({node_type})\n{offset}v\n'.format(
+            path=self.path,
+            line=self.line,
+            column=self.column,
+            queries=queries,
+            offset=column_pointer_offset,
+            type_expression=self.type_expression,
+            node_type=self.node_kind,
+        ))
+        if not color:
+            parts.append(node_text)
+            return
+
+        expression = node_text[self.column:self.end_column]
+        parts.append(node_text[:self.column])
+        parts.append(ansi.fg(ansi.Color.green, expression))
+        parts.append(node_text[self.end_column:])
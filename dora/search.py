@@ -1,210 +1,240 @@
 """Search engine."""
 
-from functools import cache
-from random import random
-from typing import Generator, Iterable
+from typing import Callable, Generator, Iterable
 
-from mypy.build import BuildManager, BuildResult, BuildSource, build
-from mypy.nodes import Expression, MypyFile, Node
+from mypy.build import BuildResult, BuildSource, Graph, State
 from mypy.options import Options as MypyOptions
 from mypy.plugin import Plugin, ReportConfigContext
 
-from dora import ansi
-from dora.mypy_legacy.traverser import ExtendedTraverserVisitor, accept
+from dora.cache import TypeRow, TypeTable, TypeTableStore
+from dora.collect import TypeRowsCollector
+from dora.matching import TypeCache
+from dora.mypy_legacy.build import build
 from dora.options import DoraOptions
+from dora.prefilter import prefilter_sources
+from dora.profile import MICROSECONDS, Profile
+from dora.result import SearchResult
+
+# Config data stored in mypy cache of the searched files and the one that never matches it.
+_CONFIG_DATA = 'dora'
+_STALE_CONFIG_DATA = 'dora:stale'
+
+# Mypy errors, mypy build graph and search results.
+SearchOutput = tuple[list[str], Graph, Iterable[SearchResult]]
 
 
 class DoraPlugin(Plugin):
-    """Plugin to force mypy revalidate source files.
+    """Plugin to force mypy revalidate source files Dora has no stored types for.
+
+    Mypy doesn't store expression types in its cache, so a source file loaded from the cache
+    cannot be searched. The plugin reports the same config data on cache write and cache check
+    only for the files whose types are stored by Dora, so the rest of source files are always rechecked.
+    Changes of the file content or its dependencies are handled by mypy itself.
 
     Inspired by MypycPlugin from mypyc.
     """
 
-    def __init__(self, sources: list[BuildSource], options: MypyOptions) -> None:
+    def __init__(
+        self,
+        sources: list[BuildSource],
+        options: MypyOptions,
+        has_stored_types: Callable[[str, str], bool] | None = None,
+    ) -> None:
         """Initialize the plugin.
 
         Args:
             sources: The build sources whose cache should be invalidated.
             options: The mypy options
+            has_stored_types: Predicate telling if Dora has stored types for the module with given id and path.
+                If not provided, all sources are rechecked.
         """
         super().__init__(options)
         self._sources = {source.path for source in sources}
+        self._has_stored_types = has_stored_types
 
-    def report_config_data(self, ctx: ReportConfigContext) -> float | None:
-        """Force revalidation of the source file.
+    def report_config_data(self, ctx: ReportConfigContext) -> str | None:
+        """Report config data that invalidates the source file cache if Dora has no types for it.
 
         Args:
             ctx: The report configuration context.
 
         Returns:
-            A random number to force revalidation of the source file.
+            Deterministic config data, which differs between cache write and check if the file must be rechecked.
         """
-        if ctx.path in self._sources:
-            return random()  # noqa: S311
+        if ctx.path not in self._sources:
+            return None
 
-        return None
+        if ctx.is_check and not self._is_stored(ctx.id, ctx.path):
+            return _STALE_CONFIG_DATA
 
+        return _CONFIG_DATA
 
-class SearchResult:
-    """Occurrence of a type expression in a source file."""
+    def _is_stored(self, module: str, path: str) -> bool:
+        if self._has_stored_types is None:
+            return False
 
-    def __init__(self, mypy_file: MypyFile, node: Node, type_expression: str) -> None:
-        """Initialize the search result.
+        return self._has_stored_types(module, path)
 
-        Args:
-            mypy_file: The source file where the type expression was found.
-            node: The node where the type expression was found.
-            type_expression: The type expression that was found.
-        """
-        self.mypy_file = mypy_file
-        self.node = node
-        self.type_expression = type_expression
-
-    def to_str(self, color: bool = False) -> str:
-        """Render the search result as a string.
 
-        Args:
-            color: Use ANSI colors to highlight expressions.
-
-        Returns:
-            A string representation of the search result.
-        """
-        node_type = self.node.__class__.__name__
-        column_pointer_offset = ' ' * self.node.column
-
-        node_text = self._extract_node_text(self.mypy_file.path, self.node)
-        if color:
-            end_column = self.node.end_column or self.node.column + 1
-            node_text = '{before}{highlight}{after}'.format(
-                before=node_text[:self.node.column],
-                highlight=ansi.fg(ansi.Color.green, node_text[self.node.column:end_column]),
-                after=node_text[end_column:],
-            )
-
-        result_text = '{path}:{line}:{column}\n'.format(
-            path=self.mypy_file.path,
-            line=self.node.line,
-            column=self.node.column,
-        )
-        result_text += '{column_pointer_offset}{type_expression} ({node_type})\n'.format(
-            column_pointer_offset=column_pointer_offset,
-            type_expression=self.type_expression,
-            node_type=node_type,
-        )
-        result_text += '{column_pointer_offset}v\n'.format(column_pointer_offset=column_pointer_offset)
-        result_text += node_text
-        return result_text
-
-    @classmethod
-    @cache
-    def _extract_node_text(cls, path: str, node: Node) -> str:
-        """Extract the text of a node from the source file.
+def search(
+    dora_options: DoraOptions,
+    mypy_options: MypyOptions,
+    type_cache: TypeCache | None = None,
+    on_result: Callable[[SearchResult], None] | None = None,
+    profile: Profile | None = None,
+) -> SearchOutput:
+    """Search for a type expression in a source file.
 
-        Args:
-            path: The path to the source file.
-            node: The node with location context.
+    Types of the searched modules are taken from mypy type maps as soon as each module is type checked,
+    so neither the module trees nor types of all modules are kept until the end of the build.
+    If mypy incremental mode is enabled, unchanged modules with types stored next to the mypy cache are searched
+    without being rechecked. Types are stored by the searches listing all types, e.g. by `dora index`,
+    narrower searches reject types before rendering them and don't store the incomplete types.
 
-        Returns:
-            Node occurrence in the file.
-        """
-        with open(path, 'r') as f:
-            lines = f.readlines()
+    Args:
+        dora_options: Dora options.
+        mypy_options: Mypy options.
+        type_cache: Cache of types rendering and matching against the type expressions.
+            If not provided, a new one is used.
+        on_result: Callback receiving results of each module right after the module is type checked,
+            in the type checking order. Such results are not included in the returned ones.
+        profile: Profile to add the phases times and statistics of the searched modules to.
 
-        line = node.line - 1
-        end_line = node.end_line or node.line
-        lines = lines[line:end_line]
-        return ''.join(lines)
+    Returns:
+        Mypy errors, mypy build graph and search results. Nothing is type checked if there are no source files,
+        e.g. if the prefilter drops all of them.
+    """
+    phases = profile or Profile()
+    sources = dora_options.sources
+    if dora_options.prefilter:
+        with phases.phase('prefilter'):
+            sources = prefilter_sources(sources, dora_options.type_expressions, mypy_options)
+
+    if not sources:
+        # Mypy reports an empty build to stdout, where it would mix with the results.
+        return [], {}, []
+
+    store = TypeTableStore(mypy_options) if TypeTableStore.enabled(mypy_options) else None
+    collector = TypeRowsCollector(
+        sources,
+        type_cache or TypeCache(dora_options.type_expressions, dora_options.node_kinds),
+        save_tables=store is not None,
+        on_result=on_result,
+        release_types=dora_options.release_types,
+        profile=profile,
+    )
+    build_result = _build(sources, mypy_options, collector, store, phases)
+    return build_result.errors, build_result.graph, _search(sources, build_result, collector, store)
 
 
-def search(dora_options: DoraOptions, mypy_options: MypyOptions) -> tuple[BuildResult, Iterable[SearchResult]]:
-    """Search for a type expression in a source file.
+def _build(
+    sources: list[BuildSource],
+    mypy_options: MypyOptions,
+    collector: TypeRowsCollector,
+    store: TypeTableStore | None,
+    phases: Profile,
+) -> BuildResult:
+    """Type check the source files, collecting types of the modules as soon as they are checked.
 
     Args:
-        dora_options: Dora options.
+        sources: The source files to type check.
         mypy_options: Mypy options.
+        collector: The collector of the typed expressions.
+        store: The type tables store telling which modules have stored types.
+        phases: Profile to add the type checking time to, tracing the build if requested.
 
     Returns:
-        Mypy build result and search results.
+        Mypy build result.
     """
-    mypy_options.export_types = True
-    mypy_options.preserve_asts = True
+    plugin = DoraPlugin(sources, mypy_options, store.has_table if store else None)
+    with phases.phase('type check'), phases.trace.mypy_build(mypy_options, phases.tracing) as mypy_log:
+        build_result = build(sources, mypy_options, type_map_hook=collector, stderr=mypy_log, extra_plugins=[plugin])
 
-    build_result = build(
-        sources=dora_options.sources,
-        options=mypy_options,
-        extra_plugins=[DoraPlugin(dora_options.sources, mypy_options)],
-    )
-    return build_result, _search(dora_options.sources, dora_options.type_expression, build_result)
+    if collector.profile is not None:
+        _add_check_times(collector.profile, build_result.graph)
+
+    return build_result
 
 
 def _search(
     sources: list[BuildSource],
-    type_expression: str | None,
     build_result: BuildResult,
+    collector: TypeRowsCollector,
+    store: TypeTableStore | None = None,
 ) -> Generator[SearchResult, None, None]:
     """Search for a type expression in a source file.
 
     Args:
         sources: The source files to search in.
-        type_expression: The type expression to search for.
-        build_result: The build result obtained from mypy.build.build().
+        build_result: The build result obtained from dora.mypy_legacy.build.build().
+        collector: Typed expressions of the modules type checked in the build, with the cache of types matching
+            against the searched type expressions and the profile to count the found occurrences of each module in.
+        store: The type tables store to load types of fresh modules from and save types of the rechecked ones to.
 
     Yields:
         Found occurrences of the type expression.
     """
     for bs in sources:
         state = build_result.graph.get(bs.module)
-        if state is None:
+        if state is None or state.path is None:
             continue
 
-        if state.tree is None:
-            continue
+        # Types of the streamed modules are still saved to the store.
+        rows = _module_type_rows(state, collector, store)
+        if rows is not None and state.id not in collector.streamed:
+            yield from collector.module_results(state.id, state.path, rows)
 
-        visitor = SearchVisitor(state.tree, type_expression, build_result.manager)
-        accept(state.tree, visitor)
-        yield from visitor.search_results
 
+def _module_type_rows(
+    state: State,
+    collector: TypeRowsCollector,
+    store: TypeTableStore | None,
+) -> list[TypeRow] | None:
+    """Collect types of the module expressions.
 
-class SearchVisitor(ExtendedTraverserVisitor):
-    """Performs a search for a type expression in a single ??? source file."""
+    Only expressions of the matching types are loaded from the stored table, so modules without them are skipped
+    after matching their distinct types.
 
-    def __init__(
-        self,
-        mypy_file: MypyFile,
-        type_expression: str | None,
-        manager: BuildManager,
-    ) -> None:
-        """Initialize the search visitor.
+    Args:
+        state: The module build state.
+        collector: Typed expressions of the modules type checked in the build.
+        store: The type tables store, types of the rechecked module are saved to it if the collector has all of them.
 
-        Args:
-            mypy_file: Search source file and AST root.
-            type_expression: The type expression to search for.
-            manager: The mypy BuildManager obtained from mypy.build.build() result.
-        """
-        super().__init__()
-        self.mypy_file = mypy_file
-        self.type_expression = type_expression
-        self.manager = manager
-        self.search_results: list[SearchResult] = []
+    Returns:
+        Typed expressions of the module, only of the matching types if loaded from the store,
+        or None if the module was neither rechecked nor stored.
+    """
+    rows = collector.rows.get(state.id)
+    if store is None or state.meta is None:
+        return rows
 
-    def visit(self, o: Node) -> bool:
-        """Check type_expression against given node.
+    hashes = (state.meta.hash, state.meta.interface_hash)
+    if rows is None:
+        table = store.load(state.id)
+        if table is None or (table.source_hash, table.interface_hash) != hashes:
+            return None
 
-        Args:
-            o: Target node.
+        return table.matching_rows(collector.type_cache.match)
 
-        Returns:
-            Always True to continue traversing.
-        """
-        if isinstance(o, Expression):
-            node_type = self.manager.all_types.get(o)
-            if node_type is not None:
-                if self.type_expression is None:
-                    type_expression = str(node_type)
-                else:
-                    type_expression = self.type_expression
-
-                if str(node_type) == type_expression:
-                    self.search_results.append(SearchResult(self.mypy_file, o, type_expression))
-
-        return True
+    if collector.save_tables:
+        store.save(state.id, TypeTable.from_rows(*hashes, rows))
+    else:
+        # The module may be rechecked because of changed dependencies, so the stored types may be outdated.
+        store.discard(state.id)
+
+    return rows
+
+
+def _add_check_times(profile: Profile, graph: Graph) -> None:
+    """Take mypy processing time of the searched modules from the build graph.
+
+    Mypy time of a module includes collection of its types, so the collection time is subtracted.
+
+    Args:
+        profile: The profile with statistics of the searched modules.
+        graph: The mypy build graph.
+    """
+    for module, stats in profile.modules.items():
+        state = graph.get(module)
+        if state is not None:
+            stats.check_time = max(state.time_spent_us / MICROSECONDS - stats.search_time, 0)
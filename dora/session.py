@@ -0,0 +1,359 @@
+"""In-process search session keeping a warm mypy build in memory.
+
+Example:
+    session = Session(['src/'])
+    for search_result in session.query('main.User', node_kinds=['CallExpr']):
+        print(search_result.path, search_result.line)
+
+    # After the files are rewritten, recheck them before the next queries.
+    session.refresh(['src/main.py'])
+"""
+
+import os
+from typing import Generator, Iterable, Iterator, TypeAlias
+
+from mypy.build import BuildSource, build
+from mypy.find_sources import create_source_list
+from mypy.fscache import FileSystemCache
+from mypy.nodes import Expression
+from mypy.options import Options as MypyOptions
+from mypy.server.subexpr import get_subexpressions
+from mypy.server.update import FineGrainedBuildManager
+
+from dora.cache import TypeRow
+from dora.collect import type_rows
+from dora.matching import TypeCache, match_rows
+from dora.query import NODE_KINDS
+from dora.result import SearchResult
+
+# Query key: the type expressions and the node kinds.
+QueryKey: TypeAlias = tuple[tuple[str, ...], ...]
+# Module ids and paths of the source files, as mypy takes the changed and removed files.
+ModulePaths: TypeAlias = list[tuple[str, str]]
+
+
+class ModuleTypes:
+    """Typed expressions of a module grouped by their types.
+
+    Searches match the distinct types of the module first, so modules without matching types are skipped
+    and only expressions of the matching types are listed.
+    """
+
+    def __init__(self, rows: list[TypeRow]) -> None:
+        """Group the expressions by their types.
+
+        Args:
+            rows: Typed expressions of the module in the order of the module tree.
+        """
+        self.rows = rows
+        self.by_type: dict[str, list[int]] = {}
+        for index, row in enumerate(rows):
+            self.by_type.setdefault(row[5], []).append(index)
+
+    def matching_rows(self, type_cache: TypeCache) -> list[TypeRow]:
+        """List expressions with types matching the type expressions.
+
+        Args:
+            type_cache: Cache of types matching against the searched type expressions.
+
+        Returns:
+            The matching expressions in the order of the module tree.
+        """
+        matching = [
+            index
+            for type_expression, indices in self.by_type.items()
+            if type_cache.match(type_expression)
+            for index in indices
+        ]
+        matching.sort()
+        return [self.rows[index] for index in matching]
+
+
+class QueryResults:
+    """Results of a query by module, dropped when the module is rechecked."""
+
+    def __init__(self, type_cache: TypeCache) -> None:
+        """Initialize empty results.
+
+        Args:
+            type_cache: Cache of types matching against the query type expressions.
+        """
+        self.type_cache = type_cache
+        self.modules: dict[str, list[SearchResult]] = {}
+
+    def module_results(self, module: str, path: str, module_types: ModuleTypes) -> list[SearchResult]:
+        """Get results of the query in the module, searching it on the first access.
+
+        Args:
+            module: The module id.
+            path: The module source file path.
+            module_types: Typed expressions of the module.
+
+        Returns:
+            Found occurrences of the type expressions.
+        """
+        search_results = self.modules.get(module)
+        if search_results is None:
+            rows = module_types.matching_rows(self.type_cache)
+            search_results = list(match_rows(path, rows, self.type_cache))
+            self.modules[module] = search_results
+
+        return search_results
+
+
+class SourceFiles:
+    """Source files of a session with their modification times and sizes."""
+
+    def __init__(self, sources: list[BuildSource]) -> None:
+        """Take modification times and sizes of the source files.
+
+        Args:
+            sources: The source files.
+        """
+        self.sources = sources
+        self.paths = {source.module: source.path for source in sources if source.path}
+        self.stats: dict[str, tuple[int, int]] = {}
+        for path in self.paths.values():
+            try:
+                path_stat = os.stat(path)
+            except OSError:
+                continue
+
+            self.stats[path] = (path_stat.st_mtime_ns, path_stat.st_size)
+
+    def changes(self, previous: 'SourceFiles', changed_paths: Iterable[str]) -> tuple[ModulePaths, ModulePaths]:
+        """Find the source files changed and removed since the previous ones.
+
+        Args:
+            previous: The previous source files.
+            changed_paths: Files considered changed regardless of their modification times and sizes.
+
+        Returns:
+            The changed and the removed modules with their paths.
+        """
+        forced = set(map(os.path.abspath, changed_paths))
+        removed = [
+            (module, path)
+            for module, path in previous.paths.items()
+            if module not in self.paths
+        ]
+        changed = [
+            (module, path)
+            for module, path in self.paths.items()
+            if os.path.abspath(path) in forced or self._is_changed(path, previous)
+        ]
+        return changed, removed
+
+    def select(self, paths: list[str]) -> list[BuildSource]:
+        """Select the source files in the paths.
+
+        Args:
+            paths: The source files and directories.
+
+        Returns:
+            The source files in the order of the paths, without duplicates.
+
+        Raises:
+            ValueError: If a path is not among the source files.
+        """
+        selected: dict[str, BuildSource] = {}
+        for path in map(os.path.abspath, paths):
+            matching = [source for source in self.sources if _is_within(source.path, path)]
+            if not matching:
+                raise ValueError('The path "{path}" is not among the session source files.'.format(path=path))
+
+            for source in matching:
+                selected.setdefault(source.module, source)
+
+        return list(selected.values())
+
+    def _is_changed(self, path: str, previous: 'SourceFiles') -> bool:
+        return self.stats.get(path) != previous.stats.get(path)
+
+
+class Session:
+    """Mypy build of the source files answering many queries, updated with mypy fine-grained incremental mode.
+
+    Types of each module are collected on the first query searching it, and results of each query are cached
+    per module until the module is rechecked, so repeated queries are answered without matching types again.
+    """
+
+    def __init__(self, paths: list[str], mypy_options: MypyOptions | None = None, cached_queries: int = 128) -> None:
+        """Build the source files.
+
+        Args:
+            paths: The source files and directories to search in.
+            mypy_options: Mypy options, modified for the fine-grained incremental mode. Default options if not provided.
+            cached_queries: Number of the most recently used queries to keep the results of.
+
+        Raises:
+            CompileError: If mypy fails to build the source files, e.g. because of a syntax error.
+        """
+        mypy_options = mypy_options or MypyOptions()
+        # The same setup as mypy daemon uses for fine-grained mode without cache.
+        mypy_options.export_types = True
+        mypy_options.preserve_asts = True
+        mypy_options.incremental = True
+        mypy_options.fine_grained_incremental = True
+        mypy_options.cache_dir = os.devnull
+        mypy_options.local_partial_types = True
+
+        self.paths = paths
+        self.mypy_options = mypy_options
+        self.cached_queries = cached_queries
+        self._fscache = FileSystemCache()
+        self._source_files = SourceFiles(create_source_list(paths, mypy_options, self._fscache))
+        build_result = build(sources=self.sources, options=mypy_options, fscache=self._fscache)
+        self.errors = build_result.errors
+        self._manager = FineGrainedBuildManager(build_result)
+        # Types of the searched modules, dropped when the modules are rechecked.
+        self._module_types: dict[str, ModuleTypes] = {}
+        # Results of the recent queries, the least recently used first.
+        self._queries: dict[QueryKey, QueryResults] = {}
+
+    @property
+    def sources(self) -> list[BuildSource]:
+        """The source files of the session."""
+        return self._source_files.sources
+
+    def refresh(self, changed_paths: Iterable[str] | None = None) -> None:
+        """Update the build with the added, changed and removed source files.
+
+        Files are considered changed if their modification time or size differ from the last build.
+
+        Args:
+            changed_paths: Files known to be changed, rechecked even if their modification time and size
+                are the same, e.g. if they are rewritten faster than the file system timestamps resolution.
+        """
+        # Parsed trees are cached by module id, so both caches must be flushed to reparse changed files.
+        self._fscache.flush()
+        self._manager.flush_cache()
+        source_files = SourceFiles(create_source_list(self.paths, self.mypy_options, self._fscache))
+        changed, removed = source_files.changes(self._source_files, changed_paths or [])
+        self._source_files = source_files
+        if changed or removed:
+            self._update(changed, removed)
+            self._forget_types(
+                [module for module, _ in removed]
+                + self._manager.updated_modules
+                + self._manager.processed_targets,
+            )
+
+    def query(
+        self,
+        type_expressions: str | list[str] | None = None,
+        node_kinds: list[str] | None = None,
+        paths: list[str] | None = None,
+    ) -> Iterator[SearchResult]:
+        """Search for type expressions in the current build.
+
+        The results are produced lazily, so the build must not be refreshed until they are consumed.
+
+        Args:
+            type_expressions: The type expression or expressions to search for. If not provided, all types are listed.
+            node_kinds: Class names of the expressions to search in. If not provided, all expressions are searched.
+            paths: The source files and directories to search in, all source files of the session if not provided.
+
+        Returns:
+            Found occurrences of the type expressions, in the order of the paths.
+
+        Raises:
+            ValueError: If a node kind is unknown or a path is not among the session source files.
+        """
+        type_expressions = [type_expressions] if isinstance(type_expressions, str) else list(type_expressions or [])
+        node_kinds = list(node_kinds or [])
+        _check_node_kinds(node_kinds)
+        key = (tuple(type_expressions), tuple(node_kinds))
+        sources = self.sources if paths is None else self._source_files.select(paths)
+        query_results = self._queries.pop(key, None)
+        if query_results is None:
+            query_results = QueryResults(TypeCache(type_expressions, node_kinds))
+            if self._queries and len(self._queries) >= self.cached_queries:
+                self._queries.pop(next(iter(self._queries)))
+
+        self._queries[key] = query_results
+        return self._search(sources, query_results)
+
+    def _search(self, sources: list[BuildSource], query_results: QueryResults) -> Generator[SearchResult, None, None]:
+        graph = self._manager.graph
+        for source in sources:
+            state = graph.get(source.module)
+            if state is None or state.tree is None or state.path is None:
+                continue
+
+            module_types = self._module_types.get(state.id)
+            if module_types is None:
+                tree = self._manager.manager.modules[state.id]
+                module_types = ModuleTypes(type_rows(tree, self._manager.manager.all_types, TypeCache([])))
+                self._module_types[state.id] = module_types
+
+            yield from query_results.module_results(state.id, state.path, module_types)
+
+    def _update(self, changed: ModulePaths, removed: ModulePaths) -> None:
+        """Update the build, dropping types of the replaced expressions from the type map of all modules.
+
+        Mypy adds types of the rechecked modules to the type map, but doesn't remove types of the expressions
+        replaced by reparsing the changed modules, so they would keep the old trees alive.
+        Trees of the changed modules keep their identities, so their expressions are compared before and after.
+
+        Args:
+            changed: The changed modules with their paths.
+            removed: The removed modules with their paths.
+        """
+        updated = changed + removed
+        previous = _tree_expressions(self._manager, updated)
+        self.errors = self._manager.update(changed, removed)
+        for expression in previous - _tree_expressions(self._manager, updated):
+            self._manager.manager.all_types.pop(expression, None)
+
+    def _forget_types(self, targets: list[str]) -> None:
+        """Drop types and search results of the modules containing the rechecked targets.
+
+        Args:
+            targets: Ids of the changed modules and full names of the rechecked functions and classes.
+        """
+        # The module of a target is one of its prefixes, dropping the others is harmless.
+        modules: set[str] = set()
+        for target in targets:
+            prefix = target
+            while prefix:
+                modules.add(prefix)
+                prefix = prefix.rpartition('.')[0]
+
+        for module in modules:
+            self._module_types.pop(module, None)
+            for query_results in self._queries.values():
+                query_results.modules.pop(module, None)
+
+
+def _tree_expressions(manager: FineGrainedBuildManager, modules: ModulePaths) -> set[Expression]:
+    trees = manager.manager.modules
+    return {
+        expression
+        for module, _ in modules
+        if module in trees
+        for expression in get_subexpressions(trees[module])
+    }
+
+
+def _check_node_kinds(node_kinds: Iterable[str]) -> None:
+    """Check that the node kinds are known.
+
+    Args:
+        node_kinds: Class names of the expressions.
+
+    Raises:
+        ValueError: If a node kind is unknown.
+    """
+    unknown = [kind for kind in node_kinds if kind not in NODE_KINDS]
+    if unknown:
+        kinds = ', '.join(sorted(NODE_KINDS))
+        raise ValueError('Unknown node kind "{kind}", expected one of: {kinds}'.format(kind=unknown[0], kinds=kinds))
+
+
+def _is_within(path: str | None, directory: str) -> bool:
+    if path is None:
+        return False
+
+    path = os.path.abspath(path)
+    return path == directory or path.startswith(directory + os.sep)
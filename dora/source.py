@@ -0,0 +1,118 @@
+"""Source files text cache."""
+
+import re
+from collections import OrderedDict
+
+_NEWLINE_PATTERN = re.compile('\n')
+
+
+class SourceFile:
+    """Text of a source file with offsets of its lines."""
+
+    def __init__(self, text: str) -> None:
+        """Index lines of the text.
+
+        Args:
+            text: The source file text with normalized newlines.
+        """
+        self.text = text
+        # Offsets of the lines starts and the text end.
+        self._offsets = [0]
+        self._offsets.extend(match.end() for match in _NEWLINE_PATTERN.finditer(text))
+        if self._offsets[-1] != len(text):
+            self._offsets.append(len(text))
+
+    def lines(self, line: int, end_line: int) -> str:
+        """Get the text of the lines range.
+
+        The range is sliced the same way as the list of the file lines, e.g. line -1 is the last but one line
+        of the file (mypy reports some synthesized nodes on line -1).
+
+        Args:
+            line: The first line, starting from 1.
+            end_line: The last line, inclusive.
+
+        Returns:
+            The lines with their line breaks, empty if the range is out of the file.
+        """
+        lines_count = len(self._offsets) - 1
+        start, stop, _ = slice(line - 1, end_line).indices(lines_count)
+        if start >= stop:
+            return ''
+
+        return self.text[self._offsets[start]:self._offsets[stop]]
+
+
+class SourceCache:
+    """Least recently used source files.
+
+    Search results are grouped by files, so each file is read once while its results are rendered.
+    """
+
+    def __init__(self, max_files: int = 64) -> None:
+        """Initialize empty cache.
+
+        Args:
+            max_files: Maximum number of files kept in memory.
+        """
+        self.max_files = max_files
+        self._files: OrderedDict[str, SourceFile] = OrderedDict()
+        self.lookups = 0
+        self.reads = 0
+
+    def __len__(self) -> int:
+        """Number of the cached files."""
+        return len(self._files)
+
+    def lines(self, path: str, line: int, end_line: int) -> str:
+        """Get the text of the lines range of the source file.
+
+        Args:
+            path: The source file path.
+            line: The first line, starting from 1.
+            end_line: The last line, inclusive.
+
+        Returns:
+            The lines with their line breaks.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        return self.get(path).lines(line, end_line)
+
+    def get(self, path: str) -> SourceFile:
+        """Get the source file, reading it if it is not cached.
+
+        Args:
+            path: The source file path.
+
+        Returns:
+            The source file.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        self.lookups += 1
+        source_file = self._files.get(path)
+        if source_file is not None:
+            self._files.move_to_end(path)
+            return source_file
+
+        with open(path, 'r') as f:
+            source_file = SourceFile(f.read())
+
+        self._files[path] = source_file
+
+        self.reads += 1
+        if len(self._files) > self.max_files:
+            self._files.popitem(last=False)
+
+        return source_file
+
+    def report(self) -> str:
+        """Report file reads.
+
+        Returns:
+            Human readable statistics.
+        """
+        return 'Source files: {lookups} lookups, {reads} reads'.format(lookups=self.lookups, reads=self.reads)
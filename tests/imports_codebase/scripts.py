@@ -0,0 +1,2 @@
+count: int = 'one'
+print(count)
@@ -0,0 +1,7 @@
+class User:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+
+def make_user(name: str) -> User:
+    return User(name)
@@ -0,0 +1,4 @@
+from .models import make_user
+
+user = make_user('guest')
+print(user.name)
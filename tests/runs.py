@@ -0,0 +1,128 @@
+"""Measured runs of dora CLI for the snapshot-tests and checks of the runs beyond their output.
+
+Peak RSS and number of visited expressions of each run are compared with the recorded baselines,
+a run exceeding its baseline more than the tolerance fails. Wall time depends on the machine and its load,
+so it is compared only if DORA_BASELINE_WALL is set, e.g. by `make replay_timings` on the machine recording the baselines.
+Visited expressions are counted by a separate traced run without the index and mypy cache, so the types stored
+in the cache don't answer the search and tracing doesn't slow down the measured run.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import TypeAlias
+
+PEAK_RSS_SLACK_MIB = 16
+
+# Allowed growth of each measurement over its baseline: factor and absolute slack.
+TOLERANCES = MappingProxyType({
+    'peak_rss': (1.5, PEAK_RSS_SLACK_MIB * 1024 ** 2),
+    'visited_nodes': (1.1, 0),
+    'wall': (1.5, 0.2),
+})
+COMPARED = frozenset(TOLERANCES if os.environ.get('DORA_BASELINE_WALL') else ('peak_rss', 'visited_nodes'))
+
+# Reads the binary results from stdin and writes them as a JSON list.
+READ_BINARY = (
+    sys.executable,
+    '-c',
+    'import json, sys; from dora.render import read_binary; json.dump(list(read_binary(sys.stdin.buffer)), sys.stdout)',
+)
+
+Measurements: TypeAlias = dict[str, float]
+
+
+def run(args: list[str]) -> tuple[subprocess.CompletedProcess, Measurements]:
+    with tempfile.TemporaryFile('w+') as stdout, tempfile.TemporaryFile('w+') as stderr:
+        process = subprocess.Popen(args, stdout=stdout, stderr=stderr, text=True)
+        measurements = _wait(process, time.perf_counter())
+        measurements.update(_count_visited_nodes(args))
+        stdout.seek(0)
+        stderr.seek(0)
+        completed = subprocess.CompletedProcess(args, process.returncode, stdout.read(), stderr.read())
+
+    return completed, measurements
+
+
+def imports_mypy(args: list[str]) -> bool:
+    # Python reports each imported module to stderr as "import time: self | cumulative | module" line.
+    env = {**os.environ, 'PYTHONPROFILEIMPORTTIME': '1'}
+    process = subprocess.run(args, capture_output=True, text=True, env=env)
+    modules = {
+        line.rpartition('|')[2].strip()
+        for line in process.stderr.splitlines()
+        if line.startswith('import time:')
+    }
+    # Submodules are imported after their package.
+    return 'mypy' in modules
+
+
+def binary_matches_jsonl(args: list[str], jsonl_output: str) -> bool:
+    binary_args = ['binary' if arg == 'jsonl' else arg for arg in args]
+    binary_output = subprocess.run(binary_args, capture_output=True).stdout
+    # Read by another process, as importing dora here would add mypy to peak RSS of the runs forked from this one.
+    read = subprocess.run(READ_BINARY, input=binary_output, capture_output=True)
+    jsonl_results = list(map(json.loads, jsonl_output.splitlines()))
+    return json.loads(read.stdout) == jsonl_results
+
+
+def check_measurements(measurements: Measurements, baseline: Measurements) -> str | None:
+    regressions = []
+    for name in sorted(COMPARED.intersection(measurements, baseline)):
+        factor, slack = TOLERANCES[name]
+        measured = measurements[name]
+        if measured > baseline[name] * factor + slack:
+            regressions.append('{name} {measured:.2f} exceeds baseline {baseline:.2f} x {factor} + {slack}'.format(
+                name=name,
+                measured=measured,
+                baseline=baseline[name],
+                factor=factor,
+                slack=slack,
+            ))
+
+    return '\n'.join(regressions) or None
+
+
+def _wait(process: subprocess.Popen, start: float) -> Measurements:
+    # Waited directly to get resource usage of this run only.
+    status, rusage = os.wait4(process.pid, 0)[1:]
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        'peak_rss': rusage.ru_maxrss * 1024,
+        'wall': round(time.perf_counter() - start, 3),
+    }
+
+
+def _count_visited_nodes(args: list[str]) -> Measurements:
+    if args[1:2] == ['index']:
+        return {}
+
+    # Searched without the index and the stored types, so every module is type checked and searched.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trace = Path(tmp_dir, 'trace.json')
+        traced_args = [
+            args[0],
+            '--no-index',
+            '--trace-out',
+            str(trace),
+            *args[1:],
+        ]
+        if '--' not in args:
+            traced_args.append('--')
+
+        subprocess.run([*traced_args, '--no-incremental'], capture_output=True)
+        if not trace.exists():
+            return {}
+
+        trace_events = json.loads(trace.read_text())['traceEvents']
+
+    visited_nodes = sum(
+        event['args']['nodes']
+        for event in trace_events
+        if event.get('cat') == 'module' and 'args' in event
+    )
+    return {'visited_nodes': visited_nodes}
@@ -1,20 +1,36 @@
 """Snapshot-tests of dora CLI.
 
 These tests run a dora binary and compare output with previously recorded.
+The runs are measured as well and fail if they exceed their baselines, see runs.py.
+Runs exiting before the search must not import mypy, which takes longer than the rest of their startup.
+Runs in the JSON Lines format are repeated in the binary format, which must be read back to the same results.
 """
+import json
 import os
 import shutil
 import subprocess
 from pathlib import Path
 from typing import TypeAlias
 
+from runs import Measurements, binary_matches_jsonl, check_measurements, imports_mypy, run
+
 CODEBASE_PATH = Path(__file__).parent.joinpath('codebase').relative_to(Path.cwd())
+IMPORTS_CODEBASE_PATH = Path(__file__).parent.joinpath('imports_codebase').relative_to(Path.cwd())
 RECORDS = Path(__file__).parent.joinpath('records').relative_to(Path.cwd())
 RECORDS.mkdir(exist_ok=True)
+BASELINES = Path(__file__).parent.joinpath('baselines.json').relative_to(Path.cwd())
 
-
-def _run(args: list[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(args, capture_output=True, text=True)
+# Runs exiting before the search, checked not to import mypy.
+STARTUP_TEST_CASES = frozenset((
+    'Given no args, usage should be shown',
+    'Given -h flag, help should be shown',
+    'Given non-existing file, error should be shown',
+    'Given --stream flag with --jobs flag, error should be shown',
+))
+# Runs in the JSON Lines format, checked to give the same results in the binary format.
+BINARY_TEST_CASES = frozenset((
+    'Search with JSON Lines output format',
+))
 
 
 def _build_result_text(title: str, args: list[str], result: subprocess.CompletedProcess) -> str:
@@ -26,25 +42,37 @@ def _build_result_text(title: str, args: list[str], result: subprocess.Completed
     return result_text
 
 
-def record_test_case(title: str, args: list[str]) -> None:
+def record_test_case(title: str, args: list[str]) -> Measurements:
     golden_result_path = RECORDS.joinpath(title)
-    result = _run(args)
+    result, measurements = run(args)
     golden_result_text = _build_result_text(title, args, result)
     golden_result_path.write_text(golden_result_text)
+    return measurements
 
 
-def replay_test_case(title: str, args: list[str]) -> str | None:
+def replay_test_case(title: str, args: list[str], baseline: Measurements | None = None) -> str | None:
     golden_result_path = RECORDS.joinpath(title)
-    golden_result_text = golden_result_path.read_text()
-
-    result = _run(args)
+    result, measurements = run(args)
     result_text = _build_result_text(title, args, result)
-    if result_text != golden_result_text:
+    if result_text != golden_result_path.read_text():
         failed_result_path = golden_result_path.with_suffix('.failed')
         failed_result_path.write_text(result_text)
-        result = _run(['diff', '-u', '--color', golden_result_path, failed_result_path])
+        result = subprocess.run(
+            ['diff', '-u', '--color', golden_result_path, failed_result_path],
+            capture_output=True,
+            text=True,
+        )
         return result.stdout
 
+    if title in STARTUP_TEST_CASES and imports_mypy(args):
+        return 'mypy is imported before the search'
+
+    if title in BINARY_TEST_CASES and not binary_matches_jsonl(args, result.stdout):
+        return 'results read from the binary format differ from the JSON Lines results'
+
+    if baseline is not None:
+        return check_measurements(measurements, baseline)
+
     return None
 
 
@@ -61,6 +89,10 @@ test_cases = [
         'Given non-existing file, error should be shown',
         ['dora', 'non-existing-file.py'],
     ),
+    (
+        'Given --stream flag with --jobs flag, error should be shown',
+        ['dora', CODEBASE_PATH, '--stream', '--jobs', '2'],
+    ),
     (
         'Without specified type expression, all types should be displayed',
         ['dora', CODEBASE_PATH],
@@ -85,6 +117,50 @@ test_cases = [
         'Search for `def (a: builtins.int, b: builtins.int) -> builtins.str`',
         ['dora', CODEBASE_PATH, '-t', 'def (a: builtins.int, b: builtins.int) -> builtins.str'],
     ),
+    (
+        'Search for `def (*) -> *` with wildcards',
+        ['dora', CODEBASE_PATH, '-t', 'def (*) -> *'],
+    ),
+    (
+        'Search for `Literal[*]?` with wildcards',
+        ['dora', CODEBASE_PATH, '-t', 'Literal[*]?'],
+    ),
+    (
+        'Search for several type expressions at once',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '-t', 'Literal[*]?', '-t', 'builtins.int'],
+    ),
+    (
+        'Search with --stream flag',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '--stream'],
+    ),
+    (
+        'Search with --release-types flag',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '--release-types'],
+    ),
+    (
+        'Search with --prefilter flag',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '--prefilter'],
+    ),
+    (
+        'Search with --prefilter flag should skip files not importing the searched type',
+        ['dora', IMPORTS_CODEBASE_PATH, '-t', 'tests.imports_codebase.shop.models.User', '--prefilter', '--show-mypy-errors'],
+    ),
+    (
+        'Search with --prefilter flag skipping all files should output nothing',
+        ['dora', CODEBASE_PATH, '-t', 'main.User', '--prefilter'],
+    ),
+    (
+        'Search with --jobs flag',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '--jobs', '2'],
+    ),
+    (
+        'Search in call and member expressions only',
+        ['dora', CODEBASE_PATH, '-k', 'CallExpr,MemberExpr'],
+    ),
+    (
+        'Search with JSON Lines output format',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str', '-t', 'builtins.int', '--format', 'jsonl', '--with-source'],
+    ),
     (
         'New type syntax without --show-mypy-errors flag',
         ['dora', CODEBASE_PATH / 'new_type_syntax.py'],
@@ -97,6 +173,18 @@ test_cases = [
         'New type syntax with --show-mypy-errors flag and mypy incomplete feature enabled via -- args',
         ['dora', CODEBASE_PATH / 'new_type_syntax.py', '--show-mypy-errors', '--', '--enable-incomplete-feature', 'NewGenericSyntax'],
     ),
+    (
+        'Given index command, index of all types should be built',
+        ['dora', 'index', CODEBASE_PATH],
+    ),
+    (
+        'Search for `builtins.str` with index',
+        ['dora', CODEBASE_PATH, '-t', 'builtins.str'],
+    ),
+    (
+        'Search for `Literal[*]?` with wildcards and index',
+        ['dora', CODEBASE_PATH, '-t', 'Literal[*]?'],
+    ),
 ]
 TestCase: TypeAlias = tuple[str, list[str]]
 
@@ -106,17 +194,29 @@ def clear_cache() -> None:
         shutil.rmtree(path)
 
 
-def record_test_cases(test_cases: list[TestCase]) -> None:
+def record_test_cases(test_cases: list[TestCase]) -> dict[str, Measurements]:
+    baselines = {}
     for title, args in test_cases:
         print(title, args)
-        record_test_case(title, args)
+        baselines[title] = record_test_case(title, args)
+
+    return baselines
 
 
-def replay_test_cases(test_cases: list[TestCase]) -> bool:
+def measure_test_cases(test_cases: list[TestCase]) -> dict[str, Measurements]:
+    baselines = {}
+    for title, args in test_cases:
+        print(title, args)
+        baselines[title] = run(args)[1]
+
+    return baselines
+
+
+def replay_test_cases(test_cases: list[TestCase], baselines: dict[str, Measurements]) -> bool:
     failed = False
     for title, args in test_cases:
         print(title, args, end=' ')
-        diff = replay_test_case(title, args)
+        diff = replay_test_case(title, args, baselines.get(title))
         if diff:
             print('FAILED')
             print(diff)
@@ -135,18 +235,30 @@ if __name__ == '__main__':
         print(f'Results directory contains redundant test cases: {redundant_test_cases}')
         exit(2)
 
-    if os.environ.get('DORA_SNAPSHOT_RECORD'):
-        print('Recording test cases')
+    if os.environ.get('DORA_SNAPSHOT_RECORD') or os.environ.get('DORA_BASELINE_RECORD'):
+        baselines = {}
         clear_cache()
-        record_test_cases(test_cases)
+        if os.environ.get('DORA_SNAPSHOT_RECORD'):
+            print('Recording test cases')
+            baselines['without_cache'] = record_test_cases(test_cases)
+        else:
+            print('Recording baselines w/o cache')
+            baselines['without_cache'] = measure_test_cases(test_cases)
+
+        print()
+        print('Recording baselines with cache')
+        baselines['with_cache'] = measure_test_cases(test_cases)
+        baselines_text = json.dumps(baselines, indent=2, sort_keys=True)
+        BASELINES.write_text('{baselines}\n'.format(baselines=baselines_text))
     else:
+        baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
         print('Replayning test cases w/o cache')
         clear_cache()
 
-        if replay_test_cases(test_cases):
+        if replay_test_cases(test_cases, baselines.get('without_cache', {})):
             exit(1)
 
         print()
         print('Replayning test cases with cache')
-        if replay_test_cases(test_cases):
+        if replay_test_cases(test_cases, baselines.get('with_cache', {})):
             exit(1)
@@ -0,0 +1,143 @@
+"""Behaviour tests of dora daemon and its client."""
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+CODEBASE_PATH = Path(__file__).parent.joinpath('codebase')
+# Results of listing all types of the test codebase.
+ALL_TYPES_COUNT = 70
+
+
+def _dora(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(['dora', *args], capture_output=True, text=True)
+
+
+def _start_daemon(codebase: str, socket_path: str) -> tuple[subprocess.Popen[str], str]:
+    args = ['daemon', codebase, '--socket', socket_path]
+    daemon = subprocess.Popen(['dora', *args], stderr=subprocess.PIPE, text=True)
+    assert daemon.stderr is not None
+    # The daemon reports the socket once it listens on it.
+    return daemon, daemon.stderr.readline()
+
+
+def _stop_daemon(daemon: subprocess.Popen[str]) -> None:
+    daemon.send_signal(signal.SIGINT)
+    daemon.wait()
+    assert daemon.stderr is not None
+    daemon.stderr.close()
+
+
+def _search_request(paths: list[str]) -> bytes:
+    request = {'paths': paths, 'type_expressions': [], 'node_kinds': []}
+    return f'{json.dumps(request)}\n'.encode()
+
+
+def _send(socket_path: str, line: bytes, read: bool = True) -> list[object]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(line)
+        if not read:
+            return []
+
+        with client.makefile('r') as stream:
+            return [json.loads(response) for response in stream]
+
+
+class DaemonTest(unittest.TestCase):
+    """Searches served by `dora daemon` over a Unix socket."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.codebase = os.path.join(cls.tmp_dir, 'codebase')
+        shutil.copytree(CODEBASE_PATH, cls.codebase)
+        cls.socket_path = os.path.join(cls.tmp_dir, 'dora.sock')
+        cls.daemon = _start_daemon(cls.codebase, cls.socket_path)[0]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        _stop_daemon(cls.daemon)
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_search_matches_search_without_daemon(self) -> None:
+        args = [self.codebase, '-t', 'builtins.str', '--no-color']
+        expected = _dora(*args, '--no-index').stdout
+        self.assertTrue(expected)
+        self.assertEqual(_dora(*args, '--daemon', self.socket_path).stdout, expected)
+
+    def test_changed_file_is_rechecked(self) -> None:
+        path = os.path.join(self.codebase, 'subfolder', 'changed.py')
+        self.addCleanup(os.remove, path)
+        args = [path, '-t', 'builtins.int', '--no-color', '--daemon', self.socket_path]
+        Path(path).write_text('changed = 1\n')
+        self.assertIn('changed = 1', _dora(*args).stdout)
+        Path(path).write_text('changed = 1\nchanged_again = changed + 2\n')
+        self.assertIn('changed_again', _dora(*args).stdout)
+
+    def test_not_served_path_is_rejected(self) -> None:
+        responses = _send(self.socket_path, _search_request(['/not/served.py']))
+        self.assertEqual(responses, [{'error': 'The path "/not/served.py" is not among the session source files.'}])
+
+    def test_malformed_requests_are_rejected(self) -> None:
+        requests = {
+            b'{"paths": 1}\n': 'Invalid request: "paths" must be a list of strings.',
+            b'[]\n': 'Invalid request: expected a JSON object.',
+            b'{"paths": [], "type_expressions": [1], "node_kinds": []}\n': 'Invalid request: "type_expressions" must be a list of strings.',
+        }
+        for line, error in requests.items():
+            with self.subTest(line=line):
+                self.assertEqual(_send(self.socket_path, line), [{'error': error}])
+
+        self.assertEqual(len(_send(self.socket_path, b'not json\n')), 1)
+        self.assertIsNone(self.daemon.poll())
+
+    def test_misbehaving_clients_do_not_stop_daemon(self) -> None:
+        # All types of all files, the response is written after the client has gone.
+        paths = [str(path) for path in Path(self.codebase).rglob('*.py')]
+        request = _search_request(paths)
+        for _ in range(3):
+            _send(self.socket_path, request, read=False)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(self.socket_path)
+            # The idle client is dropped after the connection timeout, then the search is served.
+            responses = _send(self.socket_path, request)
+
+        self.assertEqual(len(responses), ALL_TYPES_COUNT + 1)
+        self.assertIsNone(self.daemon.poll())
+
+
+class DaemonSocketTest(unittest.TestCase):
+    """Creation of the daemon socket."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_regular_file_is_not_replaced(self) -> None:
+        path = os.path.join(self.tmp_dir, 'victim.txt')
+        Path(path).write_text('keep me')
+        daemon_run = _dora('daemon', str(CODEBASE_PATH), '--socket', path)
+        self.assertEqual(daemon_run.returncode, 1)
+        self.assertEqual(daemon_run.stderr, f'The path "{path}" exists and is not a socket.\n')
+        self.assertEqual(Path(path).read_text(), 'keep me')
+
+    def test_stale_socket_is_replaced(self) -> None:
+        path = os.path.join(self.tmp_dir, 'stale.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(path)
+
+        daemon, serving = _start_daemon(str(CODEBASE_PATH), path)
+        _stop_daemon(daemon)
+        self.assertEqual(serving, f'Serving 4 files on {path}\n')
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
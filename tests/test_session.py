@@ -0,0 +1,136 @@
+"""Behaviour tests of dora.Session."""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Iterable
+
+import dora
+from dora.result import SearchResult
+from dora.session import Session
+
+CODEBASE_PATH = Path(__file__).parent.joinpath('codebase')
+STR_TYPE = 'builtins.str'
+INT_TYPE = 'builtins.int'
+
+
+def _paths(search_results: Iterable[SearchResult]) -> list[str]:
+    return [search_result.path for search_result in search_results]
+
+
+def _positions(search_results: Iterable[SearchResult]) -> list[tuple[str, int, int]]:
+    return [(search_result.path, search_result.line, search_result.column) for search_result in search_results]
+
+
+class CodebaseSessionTest(unittest.TestCase):
+    """Session over a copy of the test codebase."""
+
+    cached_queries = 128
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.codebase = os.path.join(cls.tmp_dir, 'codebase')
+        shutil.copytree(CODEBASE_PATH, cls.codebase)
+        cls.session = dora.Session([cls.codebase], cached_queries=cls.cached_queries)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.tmp_dir)
+
+    def path(self, *parts: str) -> str:
+        return os.path.join(self.codebase, *parts)
+
+
+class SessionQueryTest(CodebaseSessionTest):
+    """Queries of a session."""
+
+    def test_query_all_files(self) -> None:
+        paths = set(_paths(self.session.query(STR_TYPE)))
+        expected = {self.path('test.py'), self.path('subfolder', 'test2.py')}
+        self.assertEqual(paths, expected)
+
+    def test_query_paths(self) -> None:
+        main_path = self.path('test.py')
+        search_paths = [self.path('subfolder'), main_path]
+        paths = _paths(self.session.query(STR_TYPE, paths=search_paths))
+        # Results are in the order of the paths.
+        self.assertEqual(paths, sorted(paths, key=main_path.__eq__))
+        all_paths = _paths(self.session.query(STR_TYPE))
+        self.assertEqual(len(paths), len(all_paths))
+        main_paths = _paths(self.session.query(STR_TYPE, paths=[main_path]))
+        self.assertEqual(set(main_paths), {main_path})
+
+    def test_query_node_kinds(self) -> None:
+        search_results = self.session.query([STR_TYPE, INT_TYPE], node_kinds=['CallExpr'])
+        self.assertEqual({search_result.node_kind for search_result in search_results}, {'CallExpr'})
+
+    def test_unknown_node_kind(self) -> None:
+        with self.assertRaisesRegex(ValueError, 'Unknown node kind "Call", expected one of: '):
+            self.session.query(STR_TYPE, node_kinds=['Call'])
+
+    def test_unknown_path(self) -> None:
+        with self.assertRaisesRegex(ValueError, 'is not among the session source files'):
+            self.session.query(STR_TYPE, paths=[self.path('missing.py')])
+
+
+class SessionCacheTest(CodebaseSessionTest):
+    """Results of the recent queries kept by a session."""
+
+    cached_queries = 2
+
+    def test_least_recently_used_query_is_evicted(self) -> None:
+        first_str = next(self.session.query(STR_TYPE))
+        first_int = list(self.session.query(INT_TYPE))
+        # A repeated query is answered from the cache and becomes the most recently used.
+        self.assertIs(next(self.session.query(STR_TYPE)), first_str)
+        # The third query evicts the least recently used one, which is searched again.
+        next(self.session.query('Literal[*]?'))
+        self.assertIs(next(self.session.query(STR_TYPE)), first_str)
+        second_int = list(self.session.query(INT_TYPE))
+        self.assertIsNot(second_int[0], first_int[0])
+        self.assertEqual(_positions(second_int), _positions(first_int))
+
+
+class SessionRefreshTest(unittest.TestCase):
+    """Updates of a session after the source files are changed."""
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'module.py')
+        Path(self.path).write_text('x = 1\n')
+        self.session = Session([tmp_dir])
+
+    def test_changed_paths_are_rechecked(self) -> None:
+        self.assertEqual(len(_paths(self.session.query(INT_TYPE))), 1)
+        # The same size and modification time, so the change is seen only if the file is passed to refresh.
+        path_stat = os.stat(self.path)
+        Path(self.path).write_text("x='a'\n")
+        os.utime(self.path, ns=(path_stat.st_atime_ns, path_stat.st_mtime_ns))
+        self.session.refresh()
+        self.assertEqual(len(_paths(self.session.query(INT_TYPE))), 1)
+        self.session.refresh([self.path])
+        self.assertEqual(_paths(self.session.query(INT_TYPE)), [])
+        self.assertEqual(_paths(self.session.query(STR_TYPE)), [self.path])
+
+    def test_changed_files_are_found(self) -> None:
+        self.assertEqual(len(_paths(self.session.query(INT_TYPE))), 1)
+        Path(self.path).write_text('x = 1\ny = x + 1\n')
+        self.session.refresh()
+        self.assertEqual(len(_paths(self.session.query(INT_TYPE))), 4)
+
+    def test_types_of_replaced_trees_are_dropped(self) -> None:
+        all_types = self.session._manager.manager.all_types  # noqa: WPS437
+        Path(self.path).write_text('x = 1\ny = [x, x + 1]\n')
+        self.session.refresh()
+        types_count = len(all_types)
+        for _ in range(3):
+            self.session.refresh([self.path])
+
+        self.assertEqual(len(all_types), types_count)
+
+
+if __name__ == '__main__':
+    unittest.main()